@@ -2,66 +2,70 @@ import os
 import shutil
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from flatten_data import VisaDataProcessor
-import seaborn as sns
+from simulation_summary import SimulationSummary
+from instrumentation import span
+import rendering
+
+SCENARIOS = ("Pessimistic", "Realistic", "Optimistic")
+SCENARIO_COLORS = {"Pessimistic": "#ff4d4d", "Realistic": "#ffa600", "Optimistic": "#2db300"}
+SPILLOVER_SCENARIOS = ["zero", "low", "moderate", "high", "extreme"]
+SPILLOVER_RANGES = {
+    "zero": (0, 2000),
+    "low": (2000, 15000),
+    "moderate": (15000, 40000),
+    "high": (40000, 60000),
+    "extreme": (100000, 160000)
+}
 
 class VisualVisaSim:
-    def __init__(self, vdp_file, country, category, sims=5000):
+    def __init__(self, vdp_file, country, category, sims=5000, seed=None):
         self.country = country
         self.category = category
         self.sims = sims
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.rng = np.random.default_rng(self.seed)
 
-        vdp = VisaDataProcessor(vdp_file, country, category)
-        self.raw_inv = vdp.flatten()
-        self.raw_inv = self.raw_inv[self.raw_inv["Visa Status"] == "Awaiting Availability"].sort_values("Date")
+        with span("VisualVisaSim.load"):
+            vdp = VisaDataProcessor(vdp_file, country, category)
+            self.raw_inv = vdp.flatten()
+            self.raw_inv = self.raw_inv[self.raw_inv["Visa Status"] == "Awaiting Availability"].sort_values("Date")
         self.hidden_total_snapshot = float(vdp.get_i140_snapshot())
 
         self.annual_base_quota = 140000 * 0.07 * 0.286
+        # The queue (inventory plus the spread-out hidden backlog) is the same for
+        # every scenario and target date, so it is built once.
+        self.queue = None
 
     def _get_scenario_parameters(self, mode):
         if mode == "Pessimistic":
             return {
                 "deflation_min": 0.80, "deflation_max": 0.90,
                 "attrition_min": 0.005, "attrition_max": 0.01,
-                "family_ratio_min": 1.9, "family_ratio_max": 2.0
+                "family_ratio_min": 1.9, "family_ratio_max": 2.0,
+                "spillover_probs": [0.5, 0.4, 0.1, 0.0, 0.0]
             }
         elif mode == "Realistic":
             return {
                 "deflation_min": 0.70, "deflation_max": 0.80,
                 "attrition_min": 0.005, "attrition_max": 0.01,
-                "family_ratio_min": 1.8, "family_ratio_max": 2.0
+                "family_ratio_min": 1.8, "family_ratio_max": 2.0,
+                "spillover_probs": [0.3, 0.35, 0.25, 0.08, 0.02]
             }
         else:  # Optimistic
             return {
                 "deflation_min": 0.60, "deflation_max": 0.70,
                 "attrition_min": 0.005, "attrition_max": 0.01,
-                "family_ratio_min": 1.7, "family_ratio_max": 1.9
+                "family_ratio_min": 1.7, "family_ratio_max": 1.9,
+                "spillover_probs": [0.1, 0.2, 0.4, 0.25, 0.05]
             }
 
-    def _generate_spillover_stream(self, mode, n_years=10):
-        scenarios = ["zero", "low", "moderate", "high", "extreme"]
-        ranges = {
-            "zero": (0, 2000),
-            "low": (2000, 15000),
-            "moderate": (15000, 40000),
-            "high": (40000, 60000),
-            "extreme": (100000, 160000)
-        }
-
-        if mode == "Pessimistic":
-            probs = [0.5, 0.4, 0.1, 0.0, 0.0]
-        elif mode == "Realistic":
-            probs = [0.3, 0.35, 0.25, 0.08, 0.02]
-        else:  # Optimistic
-            probs = [0.1, 0.2, 0.4, 0.25, 0.05]
-
-        spillover = []
-        for _ in range(n_years):
-            scenario = np.random.choice(scenarios, p=probs)
-            smin, smax = ranges[scenario]
-            spillover.append(np.random.randint(smin, smax + 1))
-        return np.array(spillover)
+    def _generate_spillover_stream(self, mode, n_years=10, sims=None):
+        probs = self._get_scenario_parameters(mode)["spillover_probs"]
+        shape = n_years if sims is None else (sims, n_years)
+        bounds = np.array([SPILLOVER_RANGES[scenario] for scenario in SPILLOVER_SCENARIOS])
+        choices = self.rng.choice(len(SPILLOVER_SCENARIOS), size=shape, p=probs)
+        return self.rng.integers(bounds[choices, 0], bounds[choices, 1] + 1)
 
     def _distribute_hidden_backlog(self, start_date, count):
         if count <= 0:
@@ -86,10 +90,13 @@ class VisualVisaSim:
                 rem -= take
         return np.array(dates), np.array(counts)
 
-    def run_simulation(self, target_pd_str, mode):
-        params = self._get_scenario_parameters(mode)
-        target_pd = pd.to_datetime(target_pd_str).to_datetime64()
+    def _build_queue(self):
+        if self.queue is None:
+            with span("VisualVisaSim.build_queue"):
+                self.queue = self._concat_queue()
+        return self.queue
 
+    def _concat_queue(self):
         inv_dates = pd.to_datetime(self.raw_inv["Date"]).values
         inv_counts = self.raw_inv["Count"].astype(float).values
         last_date = inv_dates.max()
@@ -97,14 +104,116 @@ class VisualVisaSim:
 
         full_dates = np.concatenate([inv_dates, hid_dates]) if len(hid_dates) > 0 else inv_dates
         full_counts = np.concatenate([inv_counts, hid_counts]) if len(hid_dates) > 0 else inv_counts
+        return full_dates, full_counts
+
+    def run_simulation(self, target_pd_str, mode, engine="vectorized", chunk_size=100_000):
+        if engine == "loop":
+            return self.run_simulation_loop(target_pd_str, mode)
+        if engine != "vectorized":
+            raise ValueError(f"Unknown engine: {engine}")
+
+        params = self._get_scenario_parameters(mode)
+        target_pd = pd.to_datetime(target_pd_str).to_datetime64()
+        full_dates, full_counts = self._build_queue()
+
+        results = np.empty(self.sims)
+        for start in range(0, self.sims, chunk_size):
+            n = min(chunk_size, self.sims - start)
+            deflation = self.rng.uniform(params["deflation_min"], params["deflation_max"], size=n)
+            fam_ratio = self.rng.uniform(params["family_ratio_min"], params["family_ratio_max"], size=n)
+            attrition = self.rng.uniform(params["attrition_min"], params["attrition_max"], size=n)
+            spillover_stream = self._generate_spillover_stream(mode, n_years=100, sims=n)
+            with span("VisualVisaSim.run_simulation", sims=n):
+                results[start:start + n] = self._clear_queue(
+                    full_dates, full_counts, target_pd, deflation, fam_ratio, 1 - (attrition / 12), spillover_stream
+                )
+        return results
+
+    def run_scenarios(self, target_pd_str, scenarios=SCENARIOS, chunk_size=100_000):
+        # Every scenario (a mode name or a _get_scenario_parameters-style dict) runs on
+        # the same uniforms, so differences between them are not sampling noise.
+        # All scenarios of a chunk go through one _clear_queue call. Returns an array
+        # of shape (len(scenarios), sims).
+        params = [self._get_scenario_parameters(s) if isinstance(s, str) else s for s in scenarios]
+        target_pd = pd.to_datetime(target_pd_str).to_datetime64()
+        full_dates, full_counts = self._build_queue()
+        bounds = np.array([SPILLOVER_RANGES[scenario] for scenario in SPILLOVER_SCENARIOS])
+        n_years = 100
+
+        def spread(u, key):
+            lo = np.array([p[f"{key}_min"] for p in params])[:, None]
+            hi = np.array([p[f"{key}_max"] for p in params])[:, None]
+            return (lo + u[None, :] * (hi - lo)).ravel()
+
+        results = np.empty((len(params), self.sims))
+        step = max(chunk_size // len(params), 1)
+        for start in range(0, self.sims, step):
+            n = min(step, self.sims - start)
+            u_deflation, u_fam_ratio, u_attrition = self.rng.random((3, n))
+            u_scenario, u_amount = self.rng.random((2, n, n_years))
+
+            deflation = spread(u_deflation, "deflation")
+            fam_ratio = spread(u_fam_ratio, "family_ratio")
+            attrition = spread(u_attrition, "attrition")
+            streams = []
+            for p in params:
+                cdf = np.cumsum(p["spillover_probs"])
+                choices = np.minimum(np.searchsorted(cdf / cdf[-1], u_scenario, side="right"), len(cdf) - 1)
+                lo, hi = bounds[choices, 0], bounds[choices, 1]
+                streams.append(lo + np.floor(u_amount * (hi - lo + 1)).astype(np.int64))
+            with span("VisualVisaSim.run_scenarios", sims=n * len(params)):
+                cleared = self._clear_queue(
+                    full_dates, full_counts, target_pd, deflation, fam_ratio, 1 - (attrition / 12), np.concatenate(streams)
+                )
+            results[:, start:start + n] = cleared.reshape(len(params), n)
+        return results
+
+    def _clear_queue(self, full_dates, full_counts, target_pd, deflation, fam_ratio, monthly_decay, spillover_stream):
+        # Steps every sim forward one month at a time, exactly like the loop engine,
+        # but only through the cohorts ahead of the first one dated on/after target_pd
+        # and without copying the queue: a cohort's decayed size is only tracked
+        # while it is at the head of a sim's queue.
+        n_sims = len(deflation)
+        reached = full_dates >= target_pd
+        target_idx = np.argmax(reached) if reached.any() else len(full_dates)
+        base_monthly = self.annual_base_quota / 12
+
+        idx = np.zeros(n_sims, dtype=int)
+        head = full_counts[0] * deflation * fam_ratio if len(full_counts) else np.zeros(n_sims)
+        months_passed = np.zeros(n_sims, dtype=int)
+        active = np.flatnonzero(idx < target_idx)
+        for month in range(1201):
+            if active.size == 0:
+                break
+            year_idx = month // 12
+            supply = base_monthly + (spillover_stream[active, year_idx] / 12 if year_idx < spillover_stream.shape[1] else 0)
+            head[active] = head[active] * monthly_decay[active] - supply
+
+            spill = active[head[active] <= 0]
+            while spill.size:
+                supply_left = np.abs(head[spill])
+                idx[spill] += 1
+                keep = idx[spill] < target_idx
+                spill, supply_left = spill[keep], supply_left[keep]
+                head[spill] = (full_counts[idx[spill]] * deflation[spill] * fam_ratio[spill] - supply_left) * monthly_decay[spill]
+                spill = spill[head[spill] <= 0]
+
+            months_passed[active] += 1
+            active = active[idx[active] < target_idx]
+        return months_passed / 12
+
+    def run_simulation_loop(self, target_pd_str, mode):
+        params = self._get_scenario_parameters(mode)
+        target_pd = pd.to_datetime(target_pd_str).to_datetime64()
+        full_dates, full_counts = self._build_queue()
 
         results = []
         for _ in range(self.sims):
-            deflation = np.random.uniform(params["deflation_min"], params["deflation_max"])
-            fam_ratio = np.random.uniform(params["family_ratio_min"], params["family_ratio_max"])
+            deflation = self.rng.uniform(params["deflation_min"], params["deflation_max"])
+            fam_ratio = self.rng.uniform(params["family_ratio_min"], params["family_ratio_max"])
             sim_queue = full_counts * deflation * fam_ratio
 
-            attrition = np.random.uniform(params["attrition_min"], params["attrition_max"])
+            attrition = self.rng.uniform(params["attrition_min"], params["attrition_max"])
             monthly_decay = 1 - (attrition / 12)
 
             spillover_stream = self._generate_spillover_stream(mode, n_years=100)
@@ -137,57 +246,30 @@ class VisualVisaSim:
         return np.array(results)
 
     # --- PLOTTING FUNCTIONS ---
-    def plot_individual_safety(self, data, mode, color, target_pd, output_dir):
-        plt.figure(figsize=(10, 6))
-        safe_val = np.percentile(data, 90)
-        median_val = np.median(data)
-        plt.hist(data, bins=40, color=color, alpha=0.7, edgecolor='black', density=True)
-        plt.axvline(safe_val, color='black', linestyle='--', linewidth=2,
-                    label=f'90% Safe Limit: {safe_val:.1f} Years')
-        plt.title(f"{mode} Scenario: Safety Analysis\n(Priority Date: {target_pd})", fontsize=14)
-        plt.xlabel("Years to Wait", fontsize=12)
-        plt.ylabel("Density", fontsize=12)
-        stats_text = (f"Median Wait: {median_val:.1f} yrs\n90% Chance Complete by: {safe_val:.1f} yrs")
-        plt.gca().text(0.65, 0.85, stats_text, transform=plt.gca().transAxes,
-                       fontsize=12, verticalalignment='top',
-                       bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-        plt.legend(loc='upper right')
-        plt.grid(axis='y', alpha=0.3)
-        filename = f"{output_dir}/scenario_{mode.lower()}_safety.png"
-        plt.savefig(filename)
-        plt.close()
+    # Charts are drawn from binned summaries; pass a rendering.ChartRenderer to render
+    # them in the background (a Future for the file name is returned).
+    def _render(self, chart, renderer):
+        if renderer is not None:
+            return renderer.submit(chart)
+        filename = rendering.render(chart)
         print(f"Generated: {filename}")
+        return filename
 
-    def plot_combined_ci(self, res_pess, res_real, res_opt, target_pd, output_dir):
-        plt.figure(figsize=(14, 8))
-        sns.kdeplot(res_pess, fill=True, color='#ff4d4d', alpha=0.3, label='Pessimistic')
-        sns.kdeplot(res_real, fill=True, color='#ffa600', alpha=0.3, label='Realistic')
-        sns.kdeplot(res_opt, fill=True, color='#2db300', alpha=0.3, label='Optimistic')
-
-        def add_ci_lines(data, color):
-            lower = np.percentile(data, 2.5)
-            upper = np.percentile(data, 97.5)
-            median = np.median(data)
-            ymax = plt.gca().get_ylim()[1]
-            plt.axvline(lower, color=color, linestyle='--', linewidth=2, ymax=0.95)
-            plt.axvline(upper, color=color, linestyle='--', linewidth=2, ymax=0.95)
-            plt.axvline(median, color=color, linestyle='-', linewidth=2, ymax=0.95)
-            plt.text(median, ymax*0.97, f'{median:.1f}y', color=color, ha='center', fontweight='bold',
-                     bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'))
-
-        add_ci_lines(res_pess, '#ff4d4d')
-        add_ci_lines(res_real, '#ffa600')
-        add_ci_lines(res_opt, '#2db300')
-
-        plt.title(f"Master Analysis: 95% Confidence Intervals\nTarget PD: {target_pd}", fontsize=16)
-        plt.xlabel("Years to Wait", fontsize=12)
-        plt.ylabel("Density", fontsize=12)
-        plt.legend()
-        plt.grid(axis='y', alpha=0.3)
-        filename = f"{output_dir}/master_combined_analysis.png"
-        plt.savefig(filename)
-        plt.close()
-        print(f"Generated: {filename}")
+    def plot_individual_safety(self, data, mode, color, target_pd, output_dir, renderer=None):
+        with span("VisualVisaSim.plot_individual_safety"):
+            chart = rendering.safety_chart(SimulationSummary().update(data), mode, color, target_pd,
+                                           f"{output_dir}/scenario_{mode.lower()}_safety.png")
+            return self._render(chart, renderer)
+
+    def plot_combined_ci(self, stack, target_pd, output_dir, labels=SCENARIOS, renderer=None):
+        # `stack` holds one row of results per label, e.g. the output of run_scenarios.
+        with span("VisualVisaSim.plot_combined_ci"):
+            scenarios = [
+                (label, SCENARIO_COLORS.get(label, f"C{i}"), SimulationSummary().update(results))
+                for i, (label, results) in enumerate(zip(labels, stack))
+            ]
+            chart = rendering.combined_ci_chart(scenarios, target_pd, f"{output_dir}/master_combined_analysis.png")
+            return self._render(chart, renderer)
 
 
 # --- EXECUTION ---
@@ -201,18 +283,17 @@ if __name__ == "__main__":
     file_path = os.path.join(os.getcwd(), "data", "eb_inventory_october_2025.xlsx")
     engine = VisualVisaSim(file_path, "India", "EB2", sims=1000)
     vdp = VisaDataProcessor(file_path, "India", "EB2")
-    vdp.create_line_chart()
     target_date = "2015-08-15"
-    print(f"--- Running Simulations for {target_date} ---")
-
-    r_pess = engine.run_simulation(target_date, "Pessimistic")
-    r_real = engine.run_simulation(target_date, "Realistic")
-    r_opt = engine.run_simulation(target_date, "Optimistic")
+    with rendering.ChartRenderer() as renderer:
+        charts = [vdp.create_line_chart(renderer)]
+        print(f"--- Running Simulations for {target_date} ---")
 
-    engine.plot_individual_safety(r_pess, "Pessimistic", "#ff4d4d", target_date, output_dir)
-    engine.plot_individual_safety(r_real, "Realistic", "#ffa600", target_date, output_dir)
-    engine.plot_individual_safety(r_opt, "Optimistic", "#2db300", target_date, output_dir)
+        stack = engine.run_scenarios(target_date, SCENARIOS)
+        for mode, results in zip(SCENARIOS, stack):
+            charts.append(engine.plot_individual_safety(results, mode, SCENARIO_COLORS[mode], target_date, output_dir, renderer))
 
-    engine.plot_combined_ci(r_pess, r_real, r_opt, target_date, output_dir)
+        charts.append(engine.plot_combined_ci(stack, target_date, output_dir, renderer=renderer))
+        for chart in charts:
+            print(f"Generated: {chart.result()}")
 
     print("\nDone! Check the 'simulation_images' folder.")
@@ -0,0 +1,153 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "scripts"))
+sys.path.insert(0, os.path.join(HERE, "..", "backups"))
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import macros as m
+from synthetic_workbook import write_inventory_workbook, write_i140_workbook
+
+HISTORY_FILE = os.path.join(HERE, "history.json")
+
+
+def measure(fn, repeat=3):
+    # Best-of-N wall time without tracing, then one traced run for peak allocation.
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 2 ** 20}
+
+
+def run_stages(scale, sims, repeat, country, preference, target_date):
+    from flatten_data import VisaDataProcessor
+    from monte_carlo_visa_simulation import MonteCarloVisaSimulation
+    from monte_carlo import VisualVisaSim
+    import matplotlib.pyplot as plt
+
+    m.USE_CACHE = False
+    m.I140_FILE = f"synthetic_i140_x{scale:g}.xlsx"
+    inventory_file = os.path.join(m.DATA_DIR, f"synthetic_inventory_x{scale:g}.xlsx")
+    write_inventory_workbook(inventory_file, scale)
+    write_i140_workbook(os.path.join(m.DATA_DIR, m.I140_FILE), scale)
+    plt.show = lambda *args, **kwargs: None
+
+    vdp = VisaDataProcessor(inventory_file, country, preference)
+    # Later stages work from the parsed sheet so they time only themselves.
+    vdp.inventory = vdp.parse_inventory()
+    sim = MonteCarloVisaSimulation(inventory_file, country, preference, target_date, m.VISA_BULLETIN_DATE, sims=sims, vdp=vdp, seed=0)
+    inventory, last_inv_date = sim.load_inventory()
+    results = sim.monte_carlo()
+    visual = VisualVisaSim(inventory_file, country, preference, sims=sims, seed=0)
+    scenario = visual.run_simulation(target_date, "Realistic")
+
+    stages = {
+        "flatten": lambda: vdp.parse_inventory(),
+        "set_i140_snapshot": lambda: vdp.set_i140_snapshot(),
+        "gen_people_ahead": lambda: sim.gen_people_ahead(inventory, last_inv_date),
+        "monte_carlo.vectorized": lambda: sim.monte_carlo(engine="vectorized"),
+        "monte_carlo.loop": lambda: sim.monte_carlo(engine="loop"),
+        "monte_carlo.analytic": lambda: sim.monte_carlo(engine="analytic"),
+        "VisualVisaSim.run_simulation": lambda: visual.run_simulation(target_date, "Realistic"),
+        "VisualVisaSim.run_scenarios": lambda: visual.run_scenarios(target_date),
+        "plot_histogram": lambda: sim.plot_histogram(results),
+        "create_line_chart": lambda: vdp.create_line_chart(),
+        "plot_individual_safety": lambda: visual.plot_individual_safety(scenario, "Realistic", "#ffa600", target_date, m.IMG_DIR),
+        "plot_combined_ci": lambda: visual.plot_combined_ci(np.stack([scenario] * 3), target_date, m.IMG_DIR),
+    }
+    return {name: measure(fn, repeat) for name, fn in stages.items()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(history, entry, threshold):
+    previous = [h for h in history if h["scale"] == entry["scale"] and h["sims"] == entry["sims"]]
+    if not previous:
+        return []
+    last = previous[-1]["stages"]
+    found = []
+    for name, stats in entry["stages"].items():
+        if name in last and stats["seconds"] > last[name]["seconds"] * threshold:
+            found.append(f"{name}: {last[name]['seconds']:.4f}s -> {stats['seconds']:.4f}s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic workbooks and record the results.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--sims", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--country", default="China")
+    parser.add_argument("--preference", default="EB2")
+    parser.add_argument("--target-date", default="2024-01-01")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    found = []
+    cwd = os.getcwd()
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            os.makedirs(m.DATA_DIR)
+            os.makedirs(m.IMG_DIR)
+            try:
+                stages = run_stages(scale, args.sims, args.repeat, args.country, args.preference, args.target_date)
+            finally:
+                os.chdir(cwd)
+        entry = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scale": scale,
+            "sims": args.sims,
+            "stages": stages,
+        }
+        for name, stats in stages.items():
+            print(f"x{scale:<6g} {name:<30} {stats['seconds'] * 1000:10.2f} ms {stats['peak_mb']:10.2f} MB")
+        found += [f"x{scale:g} {r}" for r in regressions(history, entry, args.threshold)]
+        history.append(entry)
+
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+
+    for r in found:
+        print(f"REGRESSION {r}")
+    if found and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
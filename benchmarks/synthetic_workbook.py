@@ -0,0 +1,101 @@
+import argparse
+import calendar
+import os
+import sys
+import numpy as np
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import macros as m
+
+COUNTRIES = ["Rest of the World", "China", "India", "Mexico", "Philippines"]
+BASE_PREFERENCES = {
+    "EB1": "Employment-Based 1st Preference Category (EB1)",
+    "EB2": "Employment-Based 2nd Preference Category (EB2)",
+    "EB3": "Employment-Based 3rd Preference Category (EB3)",
+}
+STATUSES = ["Available", "Awaiting Availability"]
+MONTHS = list(calendar.month_name)[1:]
+
+
+def _preferences(names, scale):
+    # Real sheets carry ~9 categories; extra synthetic ones stand in for growth so
+    # a sheet holds roughly `scale` times as many rows.
+    prefs = [BASE_PREFERENCES[name] for name in names]
+    extra = max(int(round(9 * scale)) - len(prefs), 0)
+    prefs += [f"Employment-Based Synthetic Preference Category {i} (EX{i})" for i in range(extra)]
+    return prefs
+
+
+def _cell(rng, d_share=0.18, dash_share=0.6):
+    # Mostly empty ("-") or suppressed ("D") cells with a long tail, like the real sheets.
+    r = rng.random()
+    if r < dash_share:
+        return "-"
+    if r < dash_share + d_share:
+        return "D"
+    return int(rng.lognormal(3, 1.5)) + 1
+
+
+def _write_sheet(ws, rng, country, prefs, first_year, last_year):
+    for i in range(m.EXCEL_SKIPROWS):
+        ws.append([f"Synthetic employment-based inventory ({country})" if i == 0 else None])
+    years = list(range(first_year, last_year + 1))
+    ws.append(
+        [m.COL_COUNTRY, m.COL_PREF, m.COL_STATUS, m.COL_PRIORITY_MONTH, f"{m.COL_YEAR_PREFIX}{m.COL_PRIOR_YEARS}"]
+        + [f"{m.COL_YEAR_PREFIX}{year}" for year in years]
+    )
+    for pref in prefs:
+        for status in STATUSES:
+            for month in MONTHS:
+                ws.append([country, pref, status, month] + [_cell(rng) for _ in range(len(years) + 1)])
+    for i in range(m.EXCEL_SKIPFOOTER):
+        ws.append([f"Footnote {i + 1}"])
+
+
+def write_inventory_workbook(path, scale=1.0, seed=0, last_year=2025):
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    wb.create_sheet(m.SHEET_NAME_README).append(["Synthetic workbook generated for benchmarks."])
+    for country in COUNTRIES:
+        names = ["EB1"] if country == "India" else list(BASE_PREFERENCES)
+        _write_sheet(wb.create_sheet(country), rng, country, _preferences(names, scale), last_year - 9, last_year)
+        if country == "India":
+            prefs = [BASE_PREFERENCES["EB2"], BASE_PREFERENCES["EB3"]] * max(int(round(scale)), 1)
+            _write_sheet(wb.create_sheet(m.SHEET_NAME_INDIA), rng, country, prefs, last_year - 20, last_year)
+    wb.save(path)
+    return path
+
+
+def write_i140_workbook(path, scale=1.0, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("I140_I360_I526_app_wait_vis")
+    for i in range(m.EXCEL_SKIPROWS):
+        ws.append(["Synthetic approved I-140 petitions awaiting visa availability" if i == 0 else None])
+    columns = list(m.I140_PREF_MAP.values()) + ["3rd (Other)", "4th (Certain Special Immigrants)", "TOTAL"]
+    ws.append(["Country"] + columns)
+    extra = [f"Synthetic Country {i}" for i in range(max(int(round(5 * scale)) - len(COUNTRIES), 0))]
+    for country in ["TOTAL"] + COUNTRIES + extra:
+        ws.append([country] + [int(rng.lognormal(9, 1.5)) for _ in columns])
+    for i in range(m.EXCEL_SKIPFOOTER):
+        ws.append([f"Footnote {i + 1}"])
+    wb.save(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic inventory and I-140 workbooks in the layout the parser expects.")
+    parser.add_argument("--scale", type=float, default=10.0, help="rows relative to the real workbooks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=".")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    inv = write_inventory_workbook(os.path.join(args.output_dir, f"synthetic_inventory_x{args.scale:g}.xlsx"), args.scale, args.seed)
+    i140 = write_i140_workbook(os.path.join(args.output_dir, f"synthetic_i140_x{args.scale:g}.xlsx"), args.scale, args.seed)
+    print(f"Wrote {inv} and {i140}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import numpy as np
+import macros as m
+import sampling
+
+# Semi-analytic counterpart of the Monte Carlo engines. The only state that carries
+# from one year to the next is the backlog, so its distribution is propagated on a
+# grid of spacing h: each year the queue either clears (at k + B_k / s_k) or
+# continues as (B_k - s_k) * (1 - attr). The supply mixture enters through an FFT
+# correlation, attrition and the shared EB3/dependant/duplicate draws through
+# Gauss-Legendre quadrature.
+#
+# Accuracy: every projection onto the grid splits mass between two neighbouring
+# points, which moves it by at most h / 2 on average (Wasserstein-1). There are two
+# per simulated year (supply binning and attrition) plus one for the initial
+# backlog, and an error of e people shifts a wait by at most e / s_min years, so
+#     bound = (2 * years + 1) * h / (2 * s_min) + 1 / steps_per_year
+# bounds the mean absolute quantile error against an infinite Monte Carlo run.
+# The second term is the time-grid resolution. The bound is a worst case (it assumes
+# every projection error has the same sign and hits the smallest supply); against
+# 400k-sim runs the observed error is within Monte Carlo noise. Beyond n_years the Monte Carlo
+# engines reuse the last year's draws where this engine keeps drawing fresh ones,
+# which only affects mass still queued after n_years.
+
+
+def _gauss_legendre(n, lo, hi):
+    x, w = np.polynomial.legendre.leggauss(n)
+    return lo + (x + 1) / 2 * (hi - lo), w / 2
+
+
+def _spread(values, weights, h, n):
+    # Linear (cloud-in-cell) assignment of point masses onto grid points 0..n-1.
+    pos = np.clip(values / h, 0, n - 1)
+    i = np.minimum(pos.astype(np.int64), n - 2)
+    frac = pos - i
+    return np.bincount(i, weights * (1 - frac), n) + np.bincount(i + 1, weights * frac, n)
+
+
+def _supply_components(params, base_quota, factor):
+    # The integer-uniform spillover ranges as continuous uniforms with the same mean.
+    bounds = np.array(list(params["SPILLOVER_RANGES"].values()), dtype=float)
+    probs = np.asarray(params["SPILLOVER_PROBS"], dtype=float)
+    lo = base_quota + factor * (bounds[:, 0] - 0.5)
+    hi = base_quota + factor * (bounds[:, 1] + 0.5)
+    return lo, hi, probs / probs.sum()
+
+
+def _supply_masses(components, h, n):
+    # Exact hat-function masses of the supply density at grid points 0..n-1, using the
+    # second antiderivative of each uniform's CDF; whatever lies past the grid is
+    # lumped into index n (it clears any backlog on the grid).
+    lo, hi, probs = components
+    x = np.arange(n + 1) * h
+
+    def antiderivative(x):
+        x = x[:, None]
+        inside = (x - lo) ** 2 / (2 * (hi - lo))
+        past = x - (lo + hi) / 2
+        return (np.where(x <= lo, 0.0, np.where(x >= hi, past, inside)) * probs).sum(axis=1)
+
+    masses = (antiderivative(x[:n] + h) - 2 * antiderivative(x[:n]) + antiderivative(x[:n] - h)) / h
+    masses = np.clip(masses, 0, None)
+    return np.append(masses, max(1.0 - masses.sum(), 0.0))
+
+
+def _correlate(p, q_fft, size):
+    # r[d] = sum_j p[d + j] q[j] for d >= 0, with q_fft the transform of q[::-1].
+    full = np.fft.irfft(np.fft.rfft(p, size) * q_fft, size)
+    return np.clip(full[len(p) - 1:2 * len(p) - 1], 0, None)
+
+
+def _run_years(p, h, components, keep_nodes, keep_weights, steps_per_year, max_years, tol, nodes):
+    lo, hi, probs = components
+    n = len(p)
+    q = _supply_masses(components, h, n)
+    s_nodes, s_weights = [], []
+    for a, b, w in zip(lo, hi, probs):
+        x, wx = _gauss_legendre(nodes * 2, a, b)
+        s_nodes.append(x)
+        s_weights.append(wx * w)
+    s_nodes, s_weights = np.concatenate(s_nodes), np.concatenate(s_weights)
+    t = np.arange(1, steps_per_year + 1) / steps_per_year
+
+    cleared = []
+    transforms = {}
+    years = 0
+    for _ in range(max_years):
+        years += 1
+        # The backlog only shrinks, so the grid is cut to the next power of two that
+        # still holds all but a negligible tail and the supply transform is reused per length.
+        held = np.flatnonzero(p > tol * 1e-3)
+        used = held.max() + 2 if held.size else 2
+        p = p[:min(1 << int(np.ceil(np.log2(used))), len(p))]
+        grid = np.arange(len(p)) * h
+        # CDF of the hat-spread backlog at the grid points.
+        cdf = np.cumsum(p) - p / 2
+        total = p.sum()
+        qn = q[:len(p)]
+        now = (qn * cdf).sum() + q[len(p):].sum() * total
+        shape = (np.interp(t[:, None] * s_nodes, grid, cdf, right=total) * s_weights).sum(axis=1)
+        cleared.append(shape * (now / shape[-1]) if shape[-1] > 0 else shape)
+
+        size = 2 * len(p)
+        if len(p) not in transforms:
+            transforms[len(p)] = np.fft.rfft(qn[::-1], size)
+        survived = _correlate(p, transforms[len(p)], size)
+        survived[0] = (p * qn).sum() / 2
+        scaled = (grid[None, :] * keep_nodes[:, None]).ravel()
+        p = _spread(scaled, (survived[None, :] * keep_weights[:, None]).ravel(), h, len(survived))
+        if p.sum() < tol:
+            break
+    return np.concatenate(cleared), years
+
+
+def wait_time_distribution(people_ahead, i140_scale, base_quota, preference, n_years=m.N_YEARS, params=None,
+                           grid=m.ANALYTIC_GRID, steps_per_year=m.ANALYTIC_STEPS_PER_YEAR, nodes=m.ANALYTIC_NODES,
+                           tol=m.ANALYTIC_TOLERANCE, max_years=m.SUMMARY_MAX_YEARS):
+    # Returns (t_grid, cdf, bound): the CDF of the wait in years on t_grid and the
+    # accuracy bound above. cdf[-1] falls short of 1 by any mass still queued after
+    # max_years.
+    params = sampling.stochastic_parameters() if params is None else params
+    keep_nodes, keep_weights = _gauss_legendre(nodes, 1 - params["ATTRITION_MAX"], 1 - params["ATTRITION_MIN"])
+
+    # Initial backlog: the hidden I-140 share varies with the dependant ratio and
+    # duplicate rate, then the first year's attrition applies.
+    u, wu = _gauss_legendre(nodes, 0, 1)
+    dep = sampling.triangular_ppf(u, params["DEP_RATIO_LEFT"], params["DEP_RATIO_MODE"], params["DEP_RATIO_RIGHT"])
+    dupl, wd = _gauss_legendre(nodes, params["DUPLICATE_RATE_MIN"], params["DUPLICATE_RATE_MAX"])
+    people = people_ahead + i140_scale * (1 - dupl)[:, None] * dep[None, :]
+    weights = wd[:, None] * wu[None, :]
+    start = (people.ravel()[:, None] * keep_nodes[None, :]).ravel()
+    start_weights = (weights.ravel()[:, None] * keep_weights[None, :]).ravel()
+
+    if start.max() <= 0:
+        return np.array([0.0]), np.array([1.0]), 0.0
+
+    h = start.max() / (grid - 1)
+    p = _spread(start, start_weights, h, grid)
+
+    if preference == "EB3":
+        factors, factor_weights = _gauss_legendre(nodes, params["EB3_SPILLOVER_LOWER_BOUND"], params["EB3_SPILLOVER_UPPER_BOUND"])
+    else:
+        factors, factor_weights = np.array([1.0]), np.array([1.0])
+
+    density = []
+    years = 0
+    for factor, weight in zip(factors, factor_weights):
+        components = _supply_components(params, base_quota, factor)
+        cleared, ran = _run_years(p, h, components, keep_nodes, keep_weights, steps_per_year, max_years, tol, nodes)
+        density.append((cleared, weight))
+        years = max(years, ran)
+
+    steps = years * steps_per_year
+    by_step = np.zeros(steps)
+    for cleared, weight in density:
+        # Within each year `cleared` is cumulative; turn it into per-step increments.
+        per_year = cleared.reshape(-1, steps_per_year)
+        increments = np.diff(per_year, axis=1, prepend=0.0).ravel()
+        by_step[:len(increments)] += weight * increments
+
+    t_grid = np.concatenate([[0.0], np.arange(1, steps + 1) / steps_per_year])
+    cdf = np.minimum(np.concatenate([[0.0], np.cumsum(by_step)]), 1.0)
+    s_min = min(_supply_components(params, base_quota, f)[0].min() for f in factors)
+    bound = (2 * years + 1) * h / (2 * s_min) + 1 / steps_per_year
+    return t_grid, cdf, bound
+
+
+def quantile_samples(t_grid, cdf, sims):
+    # Stratified draws F^-1((i + 0.5) / sims); mass beyond the grid maps to its end.
+    u = (np.arange(sims) + 0.5) / sims
+    if len(t_grid) == 1:
+        return np.full(sims, t_grid[0])
+    idx = np.clip(np.searchsorted(cdf, u, side="left"), 1, len(cdf) - 1)
+    lo, hi = cdf[idx - 1], cdf[idx]
+    frac = np.where(hi > lo, (u - lo) / np.where(hi > lo, hi - lo, 1.0), 1.0)
+    return np.where(u > cdf[-1], t_grid[-1], t_grid[idx - 1] + np.clip(frac, 0, 1) * (t_grid[idx] - t_grid[idx - 1]))
@@ -0,0 +1,125 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from flatten_data import VisaDataProcessor, inventory_sheet, load_inventory_sheets, load_i140_table, lookup_i140_count
+from monte_carlo_visa_simulation import MonteCarloVisaSimulation
+from compact_inventory import CompactInventory
+import rendering
+import macros as m
+
+# Compact inventory handed to each worker once by the pool initializer.
+_SHARED = {}
+
+
+def _init_worker(file_path, compact, i140_counts):
+    _SHARED["file_path"] = file_path
+    _SHARED["compact"] = compact
+    _SHARED["i140_counts"] = i140_counts
+
+
+def _chart_path(charts_dir, country, preference, target_date):
+    name = f"{country}_{preference}_{pd.Timestamp(target_date):%Y-%m-%d}".lower().replace(" ", "_")
+    return os.path.join(charts_dir, f"{name}.png")
+
+
+def _run_job(job):
+    # Returns the results table and, when charts_dir is set, one histogram payload per
+    # target date (rendered by the parent's ChartRenderer, not here).
+    country, preference, target_dates, visa_bulletin_date, sims, years, charts_dir = job
+    if len(_SHARED["compact"].series(country, preference)[0]) == 0:
+        # No "Awaiting Availability" rows: nothing is queued for this pair.
+        return pd.DataFrame(), []
+    vdp = VisaDataProcessor(
+        _SHARED["file_path"],
+        country,
+        preference,
+        i140_count=_SHARED["i140_counts"][(country, preference)],
+        compact=_SHARED["compact"]
+    )
+    sim = MonteCarloVisaSimulation(
+        file_path=_SHARED["file_path"],
+        country=country,
+        preference=preference,
+        target_date=target_dates[0],
+        visa_bulletin_date=visa_bulletin_date,
+        sims=sims,
+        vdp=vdp
+    )
+    table, summaries = sim.wait_time_curve(target_dates, years=years, with_summaries=True)
+    charts = []
+    if charts_dir is not None:
+        for target_date, summary in zip(table.index, summaries):
+            title = f"{country} {preference}, priority date {target_date:%Y-%m-%d}"
+            charts.append(rendering.histogram_chart(summary, _chart_path(charts_dir, country, preference, target_date), title=title))
+    table = table.reset_index()
+    table.insert(0, "preference", preference)
+    table.insert(0, "country", country)
+    table.insert(3, "visa_bulletin_date", pd.Timestamp(visa_bulletin_date))
+    return table, charts
+
+
+def build_jobs(sheets, target_dates, visa_bulletin_date, sims, years, charts_dir=None):
+    countries = [s for s in sheets if s != m.SHEET_NAME_INDIA]
+    return [
+        (country, preference, list(target_dates), visa_bulletin_date, sims, years, charts_dir)
+        for country in countries
+        for preference in m.I140_PREF_MAP
+        if inventory_sheet(country, preference) in sheets
+    ]
+
+
+def run_batch(file_path, target_dates, visa_bulletin_date=m.VISA_BULLETIN_DATE, sims=m.SIMS, years=m.YEAR_LIMIT, workers=None,
+              charts_dir=None, renderer=None):
+    # With charts_dir, one histogram per (country, preference, target date) is queued
+    # on `renderer` as each job finishes; the caller owns the renderer and decides
+    # when to wait for the charts. Without a renderer, one is made here and every
+    # chart is saved before returning.
+    sheets = load_inventory_sheets(file_path)
+    i140_table = load_i140_table()
+    jobs = build_jobs(sheets, target_dates, visa_bulletin_date, sims, years, charts_dir)
+    i140_counts = {(job[0], job[1]): lookup_i140_count(i140_table, job[0], job[1]) for job in jobs}
+    own_renderer = charts_dir is not None and renderer is None
+    if own_renderer:
+        renderer = rendering.ChartRenderer()
+
+    tables = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(file_path, CompactInventory.from_sheets(sheets), i140_counts)) as pool:
+            for table, charts in pool.map(_run_job, jobs):
+                if not table.empty:
+                    tables.append(table)
+                for chart in charts:
+                    renderer.submit(chart)
+    finally:
+        if own_renderer:
+            renderer.close()
+    if not tables:
+        return pd.DataFrame(columns=["country", "preference", "target_date", "visa_bulletin_date", "people_ahead", "p50", "p95", f"prob_under_{years:g}y"])
+    return pd.concat(tables, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every country x preference simulation and write one results table.")
+    parser.add_argument("--inventory", default=os.path.join(os.getcwd(), m.DATA_DIR, m.INVENTORY_FILE))
+    parser.add_argument("--target-dates", nargs="+", default=[m.TARGET_DATE])
+    parser.add_argument("--visa-bulletin-date", default=m.VISA_BULLETIN_DATE)
+    parser.add_argument("--sims", type=int, default=m.SIMS)
+    parser.add_argument("--years", type=float, default=m.YEAR_LIMIT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=os.path.join(m.DATA_DIR, m.BATCH_RESULTS_FILE))
+    parser.add_argument("--charts", default=None, help="directory for one histogram per country, preference and target date")
+    parser.add_argument("--render-workers", type=int, default=m.RENDER_WORKERS)
+    args = parser.parse_args()
+
+    with rendering.ChartRenderer(args.render_workers) as renderer:
+        results = run_batch(args.inventory, args.target_dates, args.visa_bulletin_date, args.sims, args.years, args.workers,
+                            charts_dir=args.charts, renderer=renderer)
+        results.to_csv(args.output, index=False)
+        print(f"Wrote {len(results)} rows to {args.output}")
+    if args.charts:
+        print(f"Rendered charts to {args.charts}")
+
+
+if __name__ == "__main__":
+    main()
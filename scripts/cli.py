@@ -0,0 +1,257 @@
+import argparse
+import ast
+import datetime
+import json
+import os
+import macros as m
+
+# Command-line entry point. Any macro can be overridden without editing macros.py:
+# first from a TOML file (--config), then with --set NAME=VALUE, then with the
+# dedicated flags. The simulation modules bind macro defaults when they are
+# imported, so they are only imported after the overrides are applied; plotting
+# and progress-bar libraries are only imported when a chart or the loop engine
+# actually needs them.
+
+FLAG_MACROS = {
+    "country": "COUNTRY",
+    "preference": "PREFERENCE",
+    "target_date": "TARGET_DATE",
+    "visa_bulletin_date": "VISA_BULLETIN_DATE",
+    "sims": "SIMS",
+    "years": "YEAR_LIMIT",
+    "engine": "ENGINE",
+    "seed": "SEED",
+}
+
+
+def _is_macro(name):
+    return name.isupper() and hasattr(m, name)
+
+
+def iso_date(text):
+    try:
+        return datetime.date.fromisoformat(text.strip()).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {text!r}") from None
+
+
+TRUE_WORDS = {"true", "1", "yes", "on"}
+FALSE_WORDS = {"false", "0", "no", "off"}
+
+
+def _parse_text(name, text, current):
+    # --set values arrive as text; read them as the type the macro already has.
+    text = text.strip()
+    if isinstance(current, bool):
+        if text.lower() in TRUE_WORDS:
+            return True
+        if text.lower() in FALSE_WORDS:
+            return False
+        raise ValueError(f"{name} expects true/false, got {text!r}")
+    if isinstance(current, (int, float)):
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            return float(text)
+        except ValueError:
+            raise ValueError(f"{name} expects a number, got {text!r}") from None
+    if current is None and text.lower() == "none":
+        return None
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        raise ValueError(f"{name}: cannot parse {text!r} as a Python literal") from None
+
+
+def _coerce(name, value):
+    # Values must keep the type the macro already has; TOML and JSON have no
+    # tuples, so lists are turned back into them.
+    current = getattr(m, name)
+    if isinstance(value, str) and not isinstance(current, str):
+        value = _parse_text(name, value, current)
+    if current is None:
+        return value
+    if isinstance(current, bool) or isinstance(value, bool):
+        if type(value) is not type(current):
+            raise ValueError(f"{name} expects {type(current).__name__}, got {value!r}")
+        return value
+    if isinstance(current, int) and isinstance(value, (int, float)):
+        if not float(value).is_integer():
+            raise ValueError(f"{name} expects a whole number, got {value!r}")
+        return int(value)
+    if isinstance(current, float) and isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(current, str) and isinstance(value, str):
+        if name.endswith("_DATE"):
+            try:
+                return iso_date(value)
+            except argparse.ArgumentTypeError as e:
+                raise ValueError(f"{name}: {e}") from None
+        return value
+    if isinstance(current, tuple) and isinstance(value, (list, tuple)):
+        return tuple(value)
+    if isinstance(current, list) and isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(current, dict) and isinstance(value, dict):
+        return {k: tuple(v) if isinstance(v, list) and isinstance(current.get(k), tuple) else v for k, v in value.items()}
+    raise ValueError(f"{name} expects {type(current).__name__}, got {value!r}")
+
+
+def load_config(path):
+    # Keys are macro names (any case); tables whose name is not a macro only group
+    # keys, e.g. [simulation] country = "India".
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError as e:
+            raise ImportError("TOML config files need Python 3.11+ or tomli (pip install tomli)") from e
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+
+    overrides = {}
+
+    def collect(table):
+        for key, value in table.items():
+            name = key.upper()
+            if _is_macro(name):
+                overrides[name] = value
+            elif isinstance(value, dict):
+                collect(value)
+            else:
+                raise KeyError(f"{path}: unknown setting {key!r}")
+
+    collect(config)
+    return overrides
+
+
+def parse_assignment(text):
+    # NAME=VALUE; VALUE stays text until apply_overrides reads it as the macro's type.
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return name.strip().upper(), value
+
+
+def apply_overrides(overrides):
+    for name, value in overrides.items():
+        if not _is_macro(name):
+            raise KeyError(f"unknown setting {name!r}")
+        setattr(m, name, _coerce(name, value))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Estimate the green card wait for one country, preference and priority date.")
+    parser.add_argument("--config", help="TOML file of macro overrides")
+    parser.add_argument("--set", dest="assignments", action="append", default=[], type=parse_assignment, metavar="NAME=VALUE",
+                        help="override any macro, e.g. --set ATTRITION_MAX=0.05 (repeatable)")
+    parser.add_argument("--country")
+    parser.add_argument("--preference", choices=["EB1", "EB2", "EB3"])
+    parser.add_argument("--target-date", type=iso_date)
+    parser.add_argument("--visa-bulletin-date", type=iso_date)
+    parser.add_argument("--sims", type=int)
+    parser.add_argument("--years", type=float, help="year limit for the reported probability")
+    parser.add_argument("--engine", choices=["vectorized", "loop", "analytic"])
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--inventory", help="inventory workbook (default: DATA_DIR/INVENTORY_FILE)")
+    parser.add_argument("--inverse", action="store_true",
+                        help="report the latest safe priority date and the years needed per confidence instead")
+    parser.add_argument("--confidence", type=float, nargs="+", default=None, help="confidence levels for --inverse")
+    parser.add_argument("--no-cache", action="store_true", help="skip the simulation result cache")
+    parser.add_argument("--no-plot", action="store_true", help="do not draw the histogram")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON instead of text")
+    return parser
+
+
+def configure(args):
+    overrides = load_config(args.config) if args.config else {}
+    overrides.update(dict(args.assignments))
+    apply_overrides(overrides)
+    # argparse has already typed the flags (--years may be fractional).
+    for flag, name in FLAG_MACROS.items():
+        if getattr(args, flag) is not None:
+            setattr(m, name, getattr(args, flag))
+    if args.no_cache:
+        m.USE_RESULT_CACHE = False
+
+
+def run(args):
+    from monte_carlo_visa_simulation import MonteCarloVisaSimulation
+    from result_cache import cached_monte_carlo
+
+    file_path = args.inventory or os.path.join(os.getcwd(), m.DATA_DIR, m.INVENTORY_FILE)
+    sim = MonteCarloVisaSimulation(
+        file_path=file_path,
+        country=m.COUNTRY,
+        preference=m.PREFERENCE,
+        target_date=m.TARGET_DATE,
+        visa_bulletin_date=m.VISA_BULLETIN_DATE,
+        sims=m.SIMS,
+        seed=m.SEED,
+    )
+    if args.inverse:
+        return run_inverse(sim, args)
+    plot = not args.no_plot
+    # Only the JSON summary can be answered from a summary-only cache entry.
+    results, summary = cached_monte_carlo(sim, engine=m.ENGINE, chunk_size=m.CHUNK_SIZE, year_limit=m.YEAR_LIMIT,
+                                          store_results=m.RESULT_CACHE_STORE_RESULTS or plot or not args.json)
+    current = summary["sims"] > 0 and summary["p99"] == 0
+
+    if args.json:
+        print(json.dumps({
+            "country": sim.country,
+            "preference": sim.preference,
+            "target_date": sim.target_date.strftime("%Y-%m-%d"),
+            "visa_bulletin_date": sim.visa_bulletin_date.strftime("%Y-%m-%d"),
+            "engine": m.ENGINE,
+            "year_limit": m.YEAR_LIMIT,
+            "current": bool(current),
+            **summary,
+        }, default=float, indent=2))
+    else:
+        sim.calculate_probability(results, m.YEAR_LIMIT)
+        if current:
+            print("Date already current. 0 wait time")
+
+    if plot and not current:
+        sim.plot_histogram(results)
+    return summary
+
+
+def run_inverse(sim, args):
+    confidences = m.INVERSE_CONFIDENCES if args.confidence is None else args.confidence
+    table = sim.inverse_query(years=m.YEAR_LIMIT, confidences=confidences)
+    if args.json:
+        table = table.reset_index()
+        for column in table.columns[table.columns.str.startswith("latest_pd_")]:
+            table[column] = table[column].dt.strftime("%Y-%m-%d")
+        print(json.dumps({
+            "country": sim.country,
+            "preference": sim.preference,
+            "target_date": sim.target_date.strftime("%Y-%m-%d"),
+            "visa_bulletin_date": sim.visa_bulletin_date.strftime("%Y-%m-%d"),
+            "year_limit": m.YEAR_LIMIT,
+            "sims": sim.sims,
+            "rows": table.astype(object).where(table.notna(), None).to_dict(orient="records"),
+        }, indent=2))
+    else:
+        print(f"{sim.preference} {sim.country}, priority date {sim.target_date:%Y-%m-%d} (NaT: every date in the data qualifies)")
+        print(table.to_string())
+    return table
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        configure(args)
+    except (KeyError, ValueError) as e:
+        parser.error(e.args[0])
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
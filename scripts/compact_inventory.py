@@ -0,0 +1,121 @@
+import re
+import numpy as np
+import pandas as pd
+import macros as m
+
+AWAITING = "Awaiting Availability"
+
+
+def preference_code(category):
+    # "Employment-Based 2nd Preference Category (EB2)" -> "EB2"
+    match = re.search(r"\(([^()]+)\)\s*$", category)
+    return match.group(1) if match else category
+
+
+class CompactInventory:
+    # Every sheet as integer-coded dimensions, int32 counts and datetime64[M] months.
+    # Rows are sorted by (country, preference, status, month) once, so each group is a
+    # contiguous slice and filtering is a dictionary lookup. Rows without a month or
+    # with no one waiting are dropped, as every consumer filters them out anyway.
+    def __init__(self, country, category, status, month, count):
+        count = pd.to_numeric(pd.Series(count)).to_numpy()
+        month = np.asarray(month).astype("datetime64[M]")
+        keep = ~np.isnat(month) & (count > 0)
+
+        country_codes, self.countries = pd.factorize(np.asarray(country, dtype=object)[keep])
+        category_codes, self.categories = pd.factorize(np.asarray(category, dtype=object)[keep])
+        status_codes, self.statuses = pd.factorize(np.asarray(status, dtype=object)[keep])
+        self.preferences = np.array([preference_code(c) for c in self.categories], dtype=object)
+        pref_codes, pref_names = pd.factorize(self.preferences[category_codes])
+
+        month = month[keep]
+        order = np.lexsort((month, status_codes, pref_codes, country_codes))
+        self.country = country_codes[order].astype(np.int16)
+        self.category = category_codes[order].astype(np.int16)
+        self.status = status_codes[order].astype(np.int8)
+        self.month = month[order]
+        self.count = count[keep][order].astype(np.int32)
+
+        groups = np.stack([country_codes[order], pref_codes[order], status_codes[order]], axis=1)
+        starts = np.flatnonzero(np.concatenate([[True], (groups[1:] != groups[:-1]).any(axis=1)]))
+        ends = np.append(starts[1:], len(order))
+        self.groups = {}
+        for start, end in zip(starts, ends):
+            c, p, s = groups[start]
+            key = (self.countries[c], pref_names[p], self.statuses[s])
+            self.groups[key] = (self.month[start:end], self.count[start:end])
+        self.indices = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df[m.COL_COUNTRY], df[m.COL_PREF], df[m.COL_STATUS], df["Date"], df["Count"])
+
+    @classmethod
+    def from_sheets(cls, sheets):
+        return cls.from_frame(pd.concat(list(sheets.values()), ignore_index=True))
+
+    def series(self, country, preference, status=AWAITING):
+        empty = (np.array([], dtype="datetime64[M]"), np.array([], dtype=np.int32))
+        return self.groups.get((country, preference, status), empty)
+
+    def index(self, country, preference, status=AWAITING):
+        key = (country, preference, status)
+        if key not in self.indices:
+            self.indices[key] = BacklogIndex(*self.series(country, preference, status))
+        return self.indices[key]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.country, self.category, self.status, self.month, self.count))
+
+
+class BacklogIndex:
+    # Prefix sums over one group's monthly counts, so the people queued between two
+    # dates and the share of the I-140 gap a date falls into are binary searches.
+    # Raises IndexError for an empty group, as there is no last inventory date.
+    def __init__(self, months, counts):
+        self.months = np.asarray(months).astype("datetime64[ns]")
+        self.cumulative = np.concatenate([[0.0], np.cumsum(counts, dtype=np.float64)])
+        self.last_date = pd.Timestamp(self.months[-1])
+
+    def people_between(self, after=None, before=None):
+        # Counts for months strictly after `after` and strictly before `before`; either
+        # bound may be left open, and `before` may be an array of dates.
+        lo = 0 if after is None else np.searchsorted(self.months, _datetimes(after), side="right")
+        if before is None:
+            return self.cumulative[-1] - self.cumulative[lo]
+        hi = np.searchsorted(self.months, _datetimes(before), side="left")
+        return self.cumulative[np.maximum(hi, lo)] - self.cumulative[lo]
+
+    def latest_date(self, people, after=None):
+        # Latest date whose people_between(after, date) is at most `people`, or None when
+        # that reaches the last inventory month (targets from there on are hidden).
+        lo = 0 if after is None else np.searchsorted(self.months, _datetimes(after), side="right")
+        hi = np.searchsorted(self.cumulative, self.cumulative[lo] + people, side="right") - 1
+        if hi >= len(self.months):
+            return None
+        if hi == len(self.months) - 1:
+            return self.last_date - pd.Timedelta(days=1)
+        return pd.Timestamp(self.months[hi])
+
+    def gap_fraction(self, target, i140_inventory_date):
+        # Zero for targets the inventory still covers.
+        target = _datetimes(target)
+        last = np.datetime64(self.last_date, "ns")
+        return np.where(target >= last, gap_fraction(target, last, i140_inventory_date), 0.0)
+
+
+def gap_fraction(target, last_inv_date, i140_inventory_date):
+    # Share of the days between the last inventory month and the I-140 snapshot that
+    # lie before the target, capped at 1.
+    day = np.timedelta64(1, "D")
+    last = np.datetime64(pd.Timestamp(last_inv_date), "ns")
+    gap_days = (np.datetime64(pd.Timestamp(i140_inventory_date), "ns") - last) // day
+    pos_days = (_datetimes(target) - last) // day
+    return np.minimum(pos_days / gap_days, 1.0)
+
+
+def _datetimes(values):
+    if np.ndim(values) == 0:
+        return np.datetime64(pd.Timestamp(values), "ns")
+    return pd.DatetimeIndex(values).to_numpy().astype("datetime64[ns]")
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+import macros as m
+
+# Bump when the layout of cached frames changes.
+CACHE_VERSION = 1
+
+# Every macro that influences how a workbook is parsed into a frame.
+PARSE_MACROS = (
+    "EXCEL_SKIPROWS",
+    "EXCEL_SKIPFOOTER",
+    "VALUE_REPLACE_DASH",
+    "VALUE_REPLACE_D",
+    "COL_COUNTRY",
+    "COL_PREF",
+    "COL_STATUS",
+    "COL_PRIORITY_MONTH",
+    "COL_YEAR_PREFIX",
+    "COL_PRIOR_YEARS",
+    "I140_PREF_MAP",
+)
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def cache_key(path, sheet_name, kind):
+    payload = {
+        "version": CACHE_VERSION,
+        "kind": kind,
+        "file": file_fingerprint(path),
+        "sheet": sheet_name,
+        "macros": {name: getattr(m, name) for name in PARSE_MACROS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _entry_prefix(path, sheet_name, kind):
+    stem = f"{os.path.splitext(os.path.basename(path))[0]}-{sheet_name}"
+    return f"{kind}-{re.sub(r'[^A-Za-z0-9]+', '_', stem).strip('_')}-"
+
+
+def _save_frame(file, df):
+    arrays = {"__columns__": np.array([str(c) for c in df.columns])}
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if values.dtype.kind in "biufcmM":
+            arrays[f"col{i}"] = values.to_numpy()
+        else:
+            arrays[f"col{i}"] = values.astype(str).to_numpy(dtype=str)
+            arrays[f"na{i}"] = values.isna().to_numpy()
+    tmp = f"{file}.tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, file)
+
+
+def _load_frame(file):
+    with np.load(file, allow_pickle=False) as data:
+        frame = {}
+        for i, col in enumerate(data["__columns__"]):
+            values = pd.Series(data[f"col{i}"])
+            if f"na{i}" in data.files:
+                values = values.mask(data[f"na{i}"])
+            frame[col] = values
+        return pd.DataFrame(frame)
+
+
+def cached_frame(path, sheet_name, kind, build):
+    if not m.USE_CACHE:
+        return build()
+    prefix = _entry_prefix(path, sheet_name, kind)
+    file = os.path.join(m.CACHE_DIR, f"{prefix}{cache_key(path, sheet_name, kind)[:16]}.npz")
+    if os.path.exists(file):
+        try:
+            return _load_frame(file)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    df = build()
+    os.makedirs(m.CACHE_DIR, exist_ok=True)
+    # Drop entries for older versions of the same workbook/sheet.
+    for name in os.listdir(m.CACHE_DIR):
+        if name.startswith(prefix):
+            os.remove(os.path.join(m.CACHE_DIR, name))
+    _save_frame(file, df)
+    return df
@@ -0,0 +1,147 @@
+import calendar
+import numpy as np
+import pandas as pd
+import macros as m
+from instrumentation import span
+
+MONTH_NUMBERS = {name: i for i, name in enumerate(calendar.month_name) if name}
+
+
+def available_engine():
+    if m.EXCEL_ENGINE != "auto":
+        return m.EXCEL_ENGINE
+    try:
+        import python_calamine
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+
+class Workbook:
+    # One open of an .xlsx file. Sheets are streamed as plain value rows on demand,
+    # through calamine when it is installed and openpyxl's read-only reader otherwise.
+    def __init__(self, path, engine=None):
+        self.path = path
+        self.engine = engine or available_engine()
+        with span("flatten.open_workbook"):
+            if self.engine == "calamine":
+                from python_calamine import CalamineWorkbook
+                self.book = CalamineWorkbook.from_path(path)
+            elif self.engine == "openpyxl":
+                from openpyxl import load_workbook
+                self.book = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+            else:
+                raise ValueError(f"Unknown Excel engine: {self.engine}")
+
+    @property
+    def sheet_names(self):
+        return list(self.book.sheet_names) if self.engine == "calamine" else list(self.book.sheetnames)
+
+    def _raw_rows(self, sheet):
+        if isinstance(sheet, int):
+            sheet = self.sheet_names[sheet]
+        if self.engine == "calamine":
+            for row in self.book.get_sheet_by_name(sheet).to_python(skip_empty_area=False):
+                yield [None if v == "" else v for v in row]
+        else:
+            for row in self.book[sheet].iter_rows(values_only=True):
+                yield list(row)
+
+    def table(self, sheet):
+        # Header and body of a report sheet: the title rows and the footnotes are
+        # dropped the same way read_excel(skiprows=..., skipfooter=...) drops them.
+        with span("flatten.read_excel"):
+            rows = list(self._raw_rows(sheet))
+        while rows and all(v is None for v in rows[-1]):
+            rows.pop()
+        rows = rows[m.EXCEL_SKIPROWS:len(rows) - m.EXCEL_SKIPFOOTER]
+        if not rows:
+            raise ValueError(f"Sheet {sheet!r} has no table")
+        width = max(len(r) for r in rows)
+        header = [_column_name(v, i) for i, v in enumerate(rows[0] + [None] * (width - len(rows[0])))]
+        body = np.empty((len(rows) - 1, width), dtype=object)
+        for i, row in enumerate(rows[1:]):
+            body[i, :len(row)] = row
+        return header, body
+
+    def close(self):
+        if self.engine == "openpyxl":
+            self.book.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _column_name(value, i):
+    if value is None:
+        return f"Unnamed: {i}"
+    return str(value)
+
+
+def decode_counts(values):
+    # "-" and "D" map straight to their numeric stand-ins; anything else is a number.
+    values = np.where(values == "-", m.VALUE_REPLACE_DASH, values)
+    values = np.where(values == "D", m.VALUE_REPLACE_D, values)
+    counts = np.asarray(values, dtype=np.float64)
+    if np.isfinite(counts).all() and (counts == np.round(counts)).all():
+        return counts.astype(np.int64)
+    return counts
+
+
+def read_inventory_arrays(workbook, sheet):
+    header, body = workbook.table(sheet)
+    id_cols = [m.COL_COUNTRY, m.COL_PREF, m.COL_STATUS, m.COL_PRIORITY_MONTH]
+    id_idx = [header.index(col) for col in id_cols]
+    year_idx = [i for i in range(len(header)) if i not in id_idx]
+    labels = [header[i].replace(m.COL_YEAR_PREFIX, "") for i in year_idx]
+    prior_year = int(header[5].replace(m.COL_YEAR_PREFIX.strip(), "")) - 1
+    years = np.array([prior_year if label == m.COL_PRIOR_YEARS else int(label) for label in labels])
+
+    # Melted column-major (one block of rows per year column) like DataFrame.melt.
+    n_rows = body.shape[0]
+    months = np.array([MONTH_NUMBERS.get(v, 0) for v in body[:, id_idx[3]]])
+    month_index = (np.repeat(years, n_rows) - 1970) * 12 + np.tile(months, len(years)) - 1
+    dates = month_index.astype("datetime64[M]")
+    dates[np.tile(months, len(years)) == 0] = np.datetime64("NaT")
+    arrays = {col: np.tile(body[:, i], len(years)) for col, i in zip(id_cols, id_idx)}
+    arrays["Year"] = np.repeat(np.array(labels, dtype=object), n_rows)
+    arrays["Count"] = decode_counts(body[:, year_idx].T.ravel())
+    arrays["Date"] = dates
+    return arrays
+
+
+def inventory_frame(arrays):
+    frame = {}
+    for col, values in arrays.items():
+        if values.dtype == object:
+            values = np.where(pd.isna(values), np.nan, values)
+        elif values.dtype.kind == "M":
+            values = values.astype("datetime64[us]")
+        frame[col] = values
+    return pd.DataFrame(frame)
+
+
+def read_inventory(workbook, sheet):
+    return inventory_frame(read_inventory_arrays(workbook, sheet))
+
+
+def read_inventory_sheet(path, sheet):
+    with Workbook(path) as workbook:
+        return read_inventory(workbook, sheet)
+
+
+def read_i140_table(path, columns=None):
+    # Only the Country column and the requested preference columns are decoded.
+    with Workbook(path) as workbook:
+        header, body = workbook.table(0)
+    country_idx = header.index("Country")
+    columns = [c for c in header if c != "Country"] if columns is None else list(columns)
+    frame = {"Country": np.array([str(v).strip() if v is not None else "nan" for v in body[:, country_idx]], dtype=object)}
+    for col in columns:
+        values = body[:, header.index(col)]
+        values = np.where(values == "-", m.VALUE_REPLACE_DASH, values)
+        frame[col] = pd.to_numeric(pd.Series(values), errors="coerce").fillna(0).astype(np.float64).to_numpy()
+    return pd.DataFrame(frame)
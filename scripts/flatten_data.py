@@ -1,68 +1,110 @@
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
 import macros as m
+import data_cache
+import excel_reader
+import rendering
+from compact_inventory import CompactInventory
+from instrumentation import span
+
+def inventory_sheet(country_name, preference):
+    if (preference == "EB2" or preference == "EB3") and country_name == "India":
+        return m.SHEET_NAME_INDIA
+    return country_name
+
+
+def get_prior_year(df):
+    list_columns = list(df.columns)
+    year = int(list_columns[5].replace(m.COL_YEAR_PREFIX.strip(), "")) - 1
+    return year
+
+
+def load_inventory_sheets(file_path, sheet_names=None):
+    # Sheets missing from the cache are parsed from a single open of the workbook.
+    workbook = {}
+
+    def book():
+        if "file" not in workbook:
+            workbook["file"] = excel_reader.Workbook(file_path)
+        return workbook["file"]
+
+    if sheet_names is None:
+        names = data_cache.cached_frame(file_path, "sheet_names", "sheets", lambda: pd.DataFrame({"sheet": book().sheet_names}))
+        sheet_names = [s for s in names["sheet"] if s != m.SHEET_NAME_README]
+
+    sheets = {}
+    with span("load_inventory_sheets"):
+        for sheet in sheet_names:
+            sheets[sheet] = data_cache.cached_frame(file_path, sheet, "inventory", lambda sheet=sheet: excel_reader.read_inventory(book(), sheet))
+    if "file" in workbook:
+        workbook["file"].close()
+    return sheets
+
+
+def parse_i140_table(file):
+    # Only the preference columns the simulations look up are decoded.
+    return excel_reader.read_i140_table(file, columns=list(m.I140_PREF_MAP.values()))
+
+
+def load_i140_table(file=None):
+    file = os.path.join(os.getcwd(), m.DATA_DIR, m.I140_FILE) if file is None else file
+    with span("load_i140_table"):
+        return data_cache.cached_frame(file, 0, "i140", lambda: parse_i140_table(file))
+
+
+def lookup_i140_count(data, country_name, preference):
+    row = data[data["Country"] == country_name]
+
+    mapping = m.I140_PREF_MAP
+
+    if row.empty:
+        return 0
+    return int(row[mapping.get(preference)].iloc[0])
+
 
 class VisaDataProcessor():
-    def __init__(self, file_path, country_name, preference, preference_range=m.COLORS_DEFAULT):
+    def __init__(self, file_path, country_name, preference, preference_range=m.COLORS_DEFAULT, inventory=None, i140_count=None, compact=None):
         self.file_path = file_path
         self.country_name = country_name
         self.preference = preference
-        self.sheet_name = self.country_name
+        self.sheet_name = inventory_sheet(country_name, preference)
         self.preference_range = preference_range
+        self.inventory = inventory
+        self.compact = compact
         
-        if (self.preference == "EB2" or self.preference == "EB3") and self.country_name == "India":
-            self.sheet_name = m.SHEET_NAME_INDIA
+        if self.sheet_name == m.SHEET_NAME_INDIA:
             self.preference_range = m.COLORS_INDIA
-        self.i_140_count = self.set_i140_snapshot()
+        self.i_140_count = self.set_i140_snapshot() if i140_count is None else i140_count
     def flatten(self):
-        data = pd.read_excel(self.file_path, self.sheet_name, skiprows=m.EXCEL_SKIPROWS, skipfooter=m.EXCEL_SKIPFOOTER)
-        df = pd.DataFrame(data)
-        id_cols = [m.COL_COUNTRY, m.COL_PREF, m.COL_STATUS, m.COL_PRIORITY_MONTH]
-        prior_year = self.get_prior_year(df)
-        df_flat = df.melt(id_vars=id_cols, var_name="Year", value_name="Count")
-        df_flat["Year"] = df_flat["Year"].str.replace(m.COL_YEAR_PREFIX, "", regex=False)
-        df_flat["Count"] = pd.to_numeric(df_flat["Count"].replace("-", m.VALUE_REPLACE_DASH).replace("D", m.VALUE_REPLACE_D))
-        temp_yrs = df_flat["Year"].replace(m.COL_PRIOR_YEARS, str(prior_year))
-        df_flat["Date"] = pd.to_datetime(df_flat[m.COL_PRIORITY_MONTH] + " " + temp_yrs, format="%B %Y")
-        return df_flat
+        if self.inventory is not None:
+            return self.inventory
+        with span("VisaDataProcessor.flatten"):
+            return data_cache.cached_frame(self.file_path, self.sheet_name, "inventory", self.parse_inventory)
+
+    def compact_inventory(self):
+        if self.compact is None:
+            self.compact = CompactInventory.from_frame(self.flatten())
+        return self.compact
+
+    def parse_inventory(self):
+        return excel_reader.read_inventory_sheet(self.file_path, self.sheet_name)
 
     def get_prior_year(self, df):
-        list_columns = list(df.columns)
-        year = int(list_columns[5].replace(m.COL_YEAR_PREFIX.strip(), "")) - 1
-        return year
-
-    def create_line_chart(self):
-        df_flat = self.flatten()
-        back_log = df_flat[df_flat[m.COL_STATUS] == "Awaiting Availability"]
-        plt.figure(figsize=(12, 6))
-        for pref, color in self.preference_range.items():
-            temp = back_log[back_log[m.COL_PREF].str.contains(pref)]
-            temp = temp[temp["Count"] > 0].sort_values("Date")
-            if not temp.empty:
-                plt.plot(temp["Date"], temp["Count"], label=f"{pref.lower()}-backlog", color=color, linewidth=2)     
-        plt.title(f"{self.country_name} Priority Date Inventory (Line)")
-        plt.xlabel("Priority Date")
-        plt.ylabel("Number of people waiting")
-        plt.legend()
-        plt.grid(True, linestyle='--', alpha=0.6)
-        plt.savefig(f'{m.DATA_DIR}/{self.country_name.lower()}_line_graph.png')
-        plt.close()
+        return get_prior_year(df)
+
+    def create_line_chart(self, renderer=None):
+        with span("VisaDataProcessor.create_line_chart"):
+            return self._create_line_chart(renderer)
+
+    def _create_line_chart(self, renderer=None):
+        chart = rendering.line_chart(self.compact_inventory(), self.country_name, self.preference_range,
+                                     f"{m.DATA_DIR}/{self.country_name.lower()}_line_graph.png")
+        if renderer is not None:
+            return renderer.submit(chart)
+        return rendering.render(chart)
 
     def get_i140_snapshot(self):
         return self.i_140_count
     def set_i140_snapshot(self):
-        file = os.path.join(os.getcwd(), m.DATA_DIR, m.I140_FILE)
-        data = pd.read_excel(file, skiprows=m.EXCEL_SKIPROWS, skipfooter=m.EXCEL_SKIPFOOTER)
-        data["Country"] = data["Country"].astype(str).str.strip()
-        cols = list(data.columns)
-        cols = cols[1:]
-        for col in cols:
-            data[col] = pd.to_numeric(data[col].replace("-", m.VALUE_REPLACE_DASH), errors="coerce").fillna(0)
-        row = data[data["Country"] == self.country_name]
-        
-        mapping = m.I140_PREF_MAP
-        
-        if row.empty:
-            return 0
-        return int(row[mapping.get(self.preference)].iloc[0])
\ No newline at end of file
+        with span("VisaDataProcessor.set_i140_snapshot"):
+            return lookup_i140_count(load_i140_table(), self.country_name, self.preference)
\ No newline at end of file
@@ -0,0 +1,121 @@
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import macros as m
+
+# Named spans around pipeline stages. Off by default; switched on without touching
+# the scripts by setting VISA_TRACE (JSON trace path) and/or VISA_PROFILE (cProfile
+# output path) in the environment, or by calling enable().
+_state = {"enabled": False, "memory": False, "trace_file": None, "profiler": None, "profile_file": None}
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(trace_file=None, profile_file=None, memory=True):
+    _state["enabled"] = True
+    _state["trace_file"] = trace_file
+    _state["memory"] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if profile_file and _state["profiler"] is None:
+        import cProfile
+        _state["profiler"] = cProfile.Profile()
+        _state["profile_file"] = profile_file
+        _state["profiler"].enable()
+
+
+def enabled():
+    return _state["enabled"]
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def span(name, sims=None):
+    if not _state["enabled"]:
+        yield
+        return
+
+    stack = _stack()
+    # tracemalloc keeps one process-wide peak, so only main-thread spans reset and
+    # report it (their peak_mb still includes what other threads allocate meanwhile).
+    memory = _state["memory"] and tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+    frame = {"start_mem": 0, "peak_seen": 0}
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["peak_seen"] = max(stack[-1]["peak_seen"], peak)
+        tracemalloc.reset_peak()
+        frame = {"start_mem": current, "peak_seen": current}
+    parent = stack[-1]["name"] if stack else None
+    frame["name"] = name
+    stack.append(frame)
+    started = time.time()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.thread_time() - cpu
+        stack.pop()
+        record = {"name": name, "parent": parent, "start": started, "wall_s": wall, "cpu_s": cpu}
+        if memory:
+            peak = max(frame["peak_seen"], tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = (peak - frame["start_mem"]) / 2 ** 20
+            if stack:
+                stack[-1]["peak_seen"] = max(stack[-1]["peak_seen"], peak)
+        if sims:
+            record["sims"] = sims
+            record["sims_per_s"] = sims / wall if wall > 0 else None
+        with _lock:
+            _spans.append(record)
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+def summary():
+    totals = {}
+    for record in spans():
+        total = totals.setdefault(record["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_mb": 0.0})
+        total["calls"] += 1
+        total["wall_s"] += record["wall_s"]
+        total["cpu_s"] += record["cpu_s"]
+        total["peak_mb"] = max(total["peak_mb"], record.get("peak_mb", 0.0))
+        if "sims" in record:
+            total["sims"] = total.get("sims", 0) + record["sims"]
+    for total in totals.values():
+        if "sims" in total and total["wall_s"] > 0:
+            total["sims_per_s"] = total["sims"] / total["wall_s"]
+    return totals
+
+
+def dump(trace_file=None):
+    trace_file = trace_file or _state["trace_file"]
+    if trace_file:
+        with open(trace_file, "w") as f:
+            json.dump({"spans": spans(), "summary": summary()}, f, indent=2)
+    profiler = _state["profiler"]
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(_state["profile_file"])
+        _state["profiler"] = None
+
+
+if os.environ.get(m.TRACE_ENV) or os.environ.get(m.PROFILE_ENV):
+    # tracemalloc slows runs several times over; VISA_TRACE_MEMORY=0 keeps timing-only traces cheap.
+    enable(trace_file=os.environ.get(m.TRACE_ENV), profile_file=os.environ.get(m.PROFILE_ENV),
+           memory=os.environ.get(m.TRACE_MEMORY_ENV, "1") != "0")
+    atexit.register(dump)
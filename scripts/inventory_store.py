@@ -0,0 +1,290 @@
+import argparse
+import datetime
+import fnmatch
+import glob
+import json
+import os
+import re
+import shutil
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+import macros as m
+import data_cache
+from compact_inventory import AWAITING, CompactInventory
+from excel_reader import MONTH_NUMBERS
+from flatten_data import load_inventory_sheets, load_i140_table
+
+# Append-only history of inventory releases and I-140 performance files. Each
+# inventory release is stored once as columnar .npy files partitioned Hive-style,
+#     history/release=2025-10/country=China/pref=EB2/{month,count,status,category}.npy
+# with the rows of every partition sorted by (status, month). I-140 quarters go to
+#     history/i140/quarter=FY2025-Q3/{country,<column>}.npy
+# manifest.json records what was ingested (and from which file), so adding a release
+# never touches the older ones, and queries memory-map only the partitions they need.
+
+STORE_VERSION = 1
+COLUMNS = ("month", "count", "status", "category")
+
+
+def release_from_name(path):
+    # "eb_inventory_october_2025.xlsx" -> "2025-10"
+    match = re.search(r"(" + "|".join(MONTH_NUMBERS) + r")[_\- ]*(\d{4})", os.path.basename(path), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Cannot tell the release month of {path}; pass release='YYYY-MM'")
+    return f"{match.group(2)}-{MONTH_NUMBERS[match.group(1).capitalize()]:02d}"
+
+
+def quarter_from_name(path):
+    # "..._performancedata_fy2025_q3.xlsx" -> "FY2025-Q3"
+    match = re.search(r"fy(\d{4})_?q(\d)", os.path.basename(path), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Cannot tell the fiscal quarter of {path}; pass quarter='FY2025-Q3'")
+    return f"FY{match.group(1)}-Q{match.group(2)}"
+
+
+def _partition(*parts):
+    return os.path.join(*(f"{key}={quote(str(value), safe='')}" for key, value in parts))
+
+
+class InventoryStore:
+    def __init__(self, directory=m.HISTORY_DIR):
+        self.directory = directory
+        self.manifest = self._read_manifest()
+        self.maps = {}
+
+    def _manifest_file(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_file()) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"version": STORE_VERSION, "releases": {}, "i140": {}}
+        if manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"{self._manifest_file()} has store version {manifest.get('version')}, expected {STORE_VERSION}")
+        return manifest
+
+    def _write_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._manifest_file()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._manifest_file())
+
+    def _check_source(self, entries, key, fingerprint, replace):
+        # True when `key` is already stored from this exact file.
+        entry = entries.get(key)
+        if entry is None:
+            return False
+        if entry["sha256"] == fingerprint["sha256"]:
+            return True
+        if not replace:
+            raise ValueError(f"{key} is already stored from {entry['source']}; pass replace=True to overwrite it")
+        return False
+
+    def _publish(self, tmp, final):
+        # Partitions are written under a temporary name and moved into place whole.
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.replace(tmp, final)
+        self.maps.clear()
+
+    def ingest(self, path, release=None, replace=False):
+        # Returns False when this file is already stored under its release.
+        release = release_from_name(path) if release is None else release
+        fingerprint = data_cache.file_fingerprint(path)
+        if self._check_source(self.manifest["releases"], release, fingerprint, replace):
+            return False
+
+        compact = CompactInventory.from_sheets(load_inventory_sheets(path))
+        preferences = compact.preferences[compact.category]
+        keys = np.stack([compact.country, np.unique(preferences, return_inverse=True)[1]], axis=1)
+        starts = np.flatnonzero(np.concatenate([[True], (keys[1:] != keys[:-1]).any(axis=1)]))
+        ends = np.append(starts[1:], len(keys))
+
+        final = os.path.join(self.directory, _partition(("release", release)))
+        tmp = f"{final}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        partitions = []
+        for start, end in zip(starts, ends):
+            country, pref = compact.countries[compact.country[start]], preferences[start]
+            relative = _partition(("country", country), ("pref", pref))
+            os.makedirs(os.path.join(tmp, relative))
+            for column in COLUMNS:
+                np.save(os.path.join(tmp, relative, f"{column}.npy"), getattr(compact, column)[start:end])
+            partitions.append({"country": country, "pref": pref, "path": relative, "rows": int(end - start)})
+        self._publish(tmp, final)
+
+        self.manifest["releases"][release] = {
+            "source": os.path.basename(path),
+            "sha256": fingerprint["sha256"],
+            "ingested": datetime.datetime.now().isoformat(timespec="seconds"),
+            "statuses": list(compact.statuses),
+            "categories": list(compact.categories),
+            "partitions": partitions,
+        }
+        self._write_manifest()
+        return True
+
+    def ingest_i140(self, path, quarter=None, replace=False):
+        quarter = quarter_from_name(path) if quarter is None else quarter
+        fingerprint = data_cache.file_fingerprint(path)
+        if self._check_source(self.manifest["i140"], quarter, fingerprint, replace):
+            return False
+
+        table = load_i140_table(path)
+        final = os.path.join(self.directory, "i140", _partition(("quarter", quarter)))
+        tmp = f"{final}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        columns = [c for c in table.columns if c != "Country"]
+        np.save(os.path.join(tmp, "country.npy"), table["Country"].to_numpy(dtype=str))
+        for i, column in enumerate(columns):
+            np.save(os.path.join(tmp, f"col{i}.npy"), table[column].to_numpy(dtype=np.float64))
+        self._publish(tmp, final)
+
+        self.manifest["i140"][quarter] = {
+            "source": os.path.basename(path),
+            "sha256": fingerprint["sha256"],
+            "ingested": datetime.datetime.now().isoformat(timespec="seconds"),
+            "columns": columns,
+        }
+        self._write_manifest()
+        return True
+
+    def ingest_directory(self, directory=m.DATA_DIR):
+        # Picks up every archived workbook; ones already stored are skipped.
+        added = []
+        for path in sorted(glob.glob(os.path.join(directory, m.INVENTORY_PATTERN))):
+            if self.ingest(path):
+                added.append(path)
+        for path in sorted(glob.glob(os.path.join(directory, m.I140_PATTERN))):
+            if self.ingest_i140(path):
+                added.append(path)
+        return added
+
+    def releases(self):
+        return sorted(self.manifest["releases"])
+
+    def quarters(self):
+        return sorted(self.manifest["i140"], key=lambda q: (q[2:6], q[-1]))
+
+    def _column(self, release, country, pref, column):
+        key = (release, country, pref, column)
+        if key not in self.maps:
+            file = os.path.join(self.directory, _partition(("release", release), ("country", country), ("pref", pref)), f"{column}.npy")
+            self.maps[key] = np.load(file, mmap_mode="r") if os.path.exists(file) else None
+        return self.maps[key]
+
+    def series(self, release, country, pref, status=AWAITING):
+        # (months, counts) of one release, sliced out of the memory-mapped columns.
+        empty = (np.array([], dtype="datetime64[M]"), np.array([], dtype=np.int32))
+        statuses = self.manifest["releases"][release]["statuses"]
+        codes = self._column(release, country, pref, "status")
+        if codes is None or status not in statuses:
+            return empty
+        code = statuses.index(status)
+        lo, hi = np.searchsorted(codes, [code, code + 1])
+        return self._column(release, country, pref, "month")[lo:hi], self._column(release, country, pref, "count")[lo:hi]
+
+    def history(self, country, pref, status=AWAITING, releases=None):
+        # Counts per priority month (rows) and release (columns); months a release
+        # does not list count as 0.
+        releases = self.releases() if releases is None else list(releases)
+        series = [self.series(release, country, pref, status) for release in releases]
+        months = np.unique(np.concatenate([s[0] for s in series])) if series else np.array([], dtype="datetime64[M]")
+        table = np.zeros((len(months), len(releases)), dtype=np.int64)
+        for j, (release_months, counts) in enumerate(series):
+            # A preference spanning several categories (EB5) lists a month once per category.
+            np.add.at(table[:, j], np.searchsorted(months, release_months), counts)
+        return pd.DataFrame(table, index=pd.DatetimeIndex(months.astype("datetime64[ns]"), name="priority_month"),
+                            columns=pd.Index(releases, name="release"))
+
+    def backlog_change(self, country, pref, before=None, after=None, status=AWAITING):
+        # Change per priority month between two releases (default: the last two).
+        releases = self.releases()
+        if before is None or after is None:
+            if len(releases) < 2:
+                raise ValueError("backlog_change needs at least two stored releases")
+            before, after = releases[-2], releases[-1]
+        table = self.history(country, pref, status, releases=[before, after])
+        table.columns = ["before", "after"]
+        table["change"] = table["after"] - table["before"]
+        return table
+
+    def frame(self, release, country=None, pref=None):
+        # The stored release in the columns CompactInventory.from_frame reads.
+        entry = self.manifest["releases"][release]
+        statuses = np.array(entry["statuses"], dtype=object)
+        categories = np.array(entry["categories"], dtype=object)
+        parts = []
+        for partition in entry["partitions"]:
+            if (country is None or partition["country"] == country) and (pref is None or partition["pref"] == pref):
+                column = lambda name: self._column(release, partition["country"], partition["pref"], name)
+                parts.append(pd.DataFrame({
+                    m.COL_COUNTRY: partition["country"],
+                    m.COL_PREF: categories[column("category")],
+                    m.COL_STATUS: statuses[column("status")],
+                    "Date": np.asarray(column("month")).astype("datetime64[ns]"),
+                    "Count": np.asarray(column("count")),
+                }))
+        if not parts:
+            return pd.DataFrame(columns=[m.COL_COUNTRY, m.COL_PREF, m.COL_STATUS, "Date", "Count"])
+        return pd.concat(parts, ignore_index=True)
+
+    def compact(self, release):
+        return CompactInventory.from_frame(self.frame(release))
+
+    def i140_history(self, country, pref):
+        # I-140 count per stored quarter for one country and preference.
+        column = m.I140_PREF_MAP[pref]
+        values = {}
+        for quarter in self.quarters():
+            entry = self.manifest["i140"][quarter]
+            directory = os.path.join(self.directory, "i140", _partition(("quarter", quarter)))
+            countries = np.load(os.path.join(directory, "country.npy"), mmap_mode="r")
+            rows = np.flatnonzero(countries == country)
+            if column in entry["columns"] and rows.size:
+                data = np.load(os.path.join(directory, f"col{entry['columns'].index(column)}.npy"), mmap_mode="r")
+                values[quarter] = float(data[rows[0]])
+        return pd.Series(values, name=f"{country} {pref}", dtype=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain and query the historical inventory store.")
+    parser.add_argument("--store", default=m.HISTORY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add new releases (default: every archived workbook in the data directory)")
+    ingest.add_argument("files", nargs="*")
+    ingest.add_argument("--release", default=None, help="YYYY-MM for a single inventory file whose name has no month")
+    ingest.add_argument("--replace", action="store_true")
+    change = commands.add_parser("change", help="backlog change per priority month between two releases")
+    change.add_argument("--country", default=m.COUNTRY)
+    change.add_argument("--preference", default=m.PREFERENCE)
+    change.add_argument("--before", default=None)
+    change.add_argument("--after", default=None)
+    args = parser.parse_args()
+
+    store = InventoryStore(args.store)
+    if args.command == "ingest":
+        if not args.files:
+            added = store.ingest_directory()
+        else:
+            added = []
+            for path in args.files:
+                if fnmatch.fnmatch(os.path.basename(path), m.I140_PATTERN):
+                    stored = store.ingest_i140(path, replace=args.replace)
+                else:
+                    stored = store.ingest(path, release=args.release, replace=args.replace)
+                if stored:
+                    added.append(path)
+        print(f"Ingested {len(added)} new file(s); {len(store.releases())} release(s) stored")
+    else:
+        table = store.backlog_change(args.country, args.preference, args.before, args.after)
+        print(table[table["change"] != 0].to_string())
+
+
+if __name__ == "__main__":
+    main()
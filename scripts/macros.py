@@ -9,6 +9,35 @@ WANT_BULLETIN = True
 SIMS = 10000
 N_YEARS = 100
 YEAR_LIMIT = 5
+# Confidence levels answered by inverse queries (latest safe priority date, years needed)
+INVERSE_CONFIDENCES = (0.5, 0.9, 0.95)
+# Simulation engine: "loop" (one sim at a time) or "vectorized" (batched arrays)
+ENGINE = "vectorized"
+# Sims per vectorized chunk; each chunk holds about 300 float64 draws per sim
+# (~2.4 KB), and throughput is flat above ~20k
+CHUNK_SIZE = 20_000
+# Reproducibility and parallel sharding (None: fresh entropy / all cores)
+SEED = None
+WORKERS = None
+SHARD_SIZE = 50_000
+# Sampling design for the batched draws: "random", "antithetic", "lhs" or "sobol" (needs scipy)
+SAMPLING_METHOD = "random"
+SAMPLING_REPLICATES = 10
+# Sensitivity sweeps reweight one base batch of draws and fall back to re-simulating
+# with common random numbers below this effective sample size (fraction of sims)
+SWEEP_MIN_ESS = 0.2
+# Streaming summary (fixed-width histogram) and convergence-based early stopping
+SUMMARY_BIN_WIDTH = 0.01
+SUMMARY_MAX_YEARS = 200
+SUMMARY_CHUNK_SIZE = 1000
+SUMMARY_MIN_SIMS = 2000
+SUMMARY_CONFIDENCE_Z = 1.96
+# Semi-analytic engine: backlog grid points, CDF steps per year, quadrature nodes and
+# the queued mass below which the year-by-year propagation stops
+ANALYTIC_GRID = 1 << 14
+ANALYTIC_STEPS_PER_YEAR = 120
+ANALYTIC_NODES = 8
+ANALYTIC_TOLERANCE = 1e-9
 # --- Quota Constants ---
 TOTAL_GREENCARDS = 140_000
 COUNTRY_CAP = 0.07
@@ -51,13 +80,50 @@ IMG_DIR = "simulation_images"
 INVENTORY_FILE = "eb_inventory_october_2025.xlsx"
 I140_FILE = "eb_i140_i360_i526_performancedata_fy2025_q3.xlsx"
 HISTOGRAM_FILE = "Monte_Carlo_Simulation.png"
+BATCH_RESULTS_FILE = "batch_results.csv"
+
+# --- Instrumentation ---
+# Environment variables that switch on stage spans: JSON trace path / cProfile output path,
+# and "0" in the last one to skip memory tracking (tracemalloc) in the trace
+TRACE_ENV = "VISA_TRACE"
+PROFILE_ENV = "VISA_PROFILE"
+TRACE_MEMORY_ENV = "VISA_TRACE_MEMORY"
+
+# --- Query Service ---
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_SIMS = 10000
+# Requests arriving within this window (seconds) share one simulation call
+SERVICE_BATCH_WINDOW = 0.005
+SERVICE_MAX_BATCH = 256
+
+# Parsed-workbook cache (invalidated when the workbook or parsing macros change)
+USE_CACHE = True
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+
+# Simulation result cache: an in-memory LRU over a size-bounded disk tier
+USE_RESULT_CACHE = True
+RESULT_CACHE_DIR = os.path.join(CACHE_DIR, "results")
+RESULT_CACHE_ENTRIES = 64
+RESULT_CACHE_MAX_MB = 256
+# Keep the raw per-sim results next to the summary (needed to redraw histograms)
+RESULT_CACHE_STORE_RESULTS = True
+
+# Append-only history of archived releases, partitioned by release, country and
+# preference; the patterns pick the archived workbooks out of DATA_DIR
+HISTORY_DIR = os.path.join(DATA_DIR, "history")
+INVENTORY_PATTERN = "eb_inventory_*.xlsx"
+I140_PATTERN = "eb_i140_*performancedata*.xlsx"
 
 # --- Excel Parsing Settings ---
 EXCEL_SKIPROWS = 3
 EXCEL_SKIPFOOTER = 12
 VALUE_REPLACE_DASH = 0
 VALUE_REPLACE_D = 5
+# "auto" streams sheets through python-calamine when installed, else openpyxl read-only
+EXCEL_ENGINE = "auto"
 SHEET_NAME_INDIA = "India (EB2 EB3)"
+SHEET_NAME_README = "How to Read This Report"
 
 # Column Identification
 COL_COUNTRY = 'Country Of Chargeability'
@@ -80,6 +146,12 @@ HIST_COLOR_BAR = "#3B82F6"
 HIST_COLOR_MEDIAN = "white"
 HIST_COLOR_95 = "#F87171"
 
+# Chart rendering: Agg worker processes (None: all cores, 0: render inline) and the
+# precomputed KDE curves (points per curve, bandwidths past the data like seaborn)
+RENDER_WORKERS = None
+KDE_POINTS = 200
+KDE_CUT = 3
+
 # --- Mappings ---
 # Mapping user preference strings to I-140 Excel columns
 I140_PREF_MAP = {
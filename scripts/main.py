@@ -1,6 +1,7 @@
 import os
 import numpy as np
 from monte_carlo_visa_simulation import MonteCarloVisaSimulation
+from result_cache import cached_monte_carlo
 from macros import *
 
 def main():
@@ -15,7 +16,8 @@ def main():
         sims=SIMS
     )
 
-    results = sim.monte_carlo()
+    # The probability printout and the histogram need the raw results.
+    results, _ = cached_monte_carlo(sim, engine=ENGINE, chunk_size=CHUNK_SIZE, store_results=True)
     sim.calculate_probability(results, YEAR_LIMIT)
     if len(results) > 0 and np.sum(results) == 0:
         print("Date already current. 0 wait time")
@@ -1,10 +1,25 @@
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from flatten_data import VisaDataProcessor
-from tqdm import tqdm
-import seaborn as sns
+from compact_inventory import gap_fraction
+from simulation_summary import SimulationSummary
+import sampling
+import analytic
+import rendering
+from instrumentation import span
 import macros as m 
+
+
+def _run_shard(job):
+    sim, people_ahead_sim, last_inv_date, seed_seq, n, year_limit = job
+    summary = SimulationSummary(year_limit=year_limit)
+    rng = np.random.default_rng(seed_seq)
+    for chunk in sim.iter_result_chunks(people_ahead_sim, last_inv_date, sims=n, rng=rng):
+        summary.update(chunk)
+    return summary
+
+
 class MonteCarloVisaSimulation:
     def __init__(
         self,
@@ -18,7 +33,9 @@ class MonteCarloVisaSimulation:
         category_preference=m.CATEGORY_PREFERENCE,
         n_years=m.N_YEARS,
         sims=m.SIMS,
-        i140_inventory_date=m.I140_INVENTORY_DATE
+        i140_inventory_date=m.I140_INVENTORY_DATE,
+        vdp=None,
+        seed=m.SEED
     ):
         self.file_path = file_path
         self.country = country
@@ -33,9 +50,21 @@ class MonteCarloVisaSimulation:
         self.visa_bulletin_date = pd.Timestamp(visa_bulletin_date)
         self.i140_inventory_date = pd.Timestamp(i140_inventory_date)
 
-        self.vdp = VisaDataProcessor(file_path, country, preference)
+        self.vdp = vdp if vdp is not None else VisaDataProcessor(file_path, country, preference)
+        self.i140_snapshot = self.vdp.get_i140_snapshot()
         self.hidden = True
 
+        # Without an explicit seed, keep the drawn entropy so any run can be reproduced.
+        self.requested_seed = seed
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.rng = np.random.default_rng(self.seed)
+
+    def __getstate__(self):
+        # Shard workers only need the scalar inputs, not the parsed workbook.
+        state = self.__dict__.copy()
+        state["vdp"] = None
+        return state
+
     def gen_sim_parameters(self):
         base_quota = self.total_greencards * self.country_cap * self.category_preference
 
@@ -44,64 +73,407 @@ class MonteCarloVisaSimulation:
         scenarios = np.array(list(ranges.keys()))
         probs = m.SPILLOVER_PROBS
 
-        choices = np.random.choice(scenarios, size=self.n_years, p=probs)
+        choices = self.rng.choice(scenarios, size=self.n_years, p=probs)
         spillover_lower_bound = np.array([ranges[i][0] for i in choices])
         spillover_upper_bound = np.array([ranges[i][1] + 1 for i in choices])
-        spillover_list = np.random.randint(spillover_lower_bound, spillover_upper_bound)
+        spillover_list = self.rng.integers(spillover_lower_bound, spillover_upper_bound)
         if self.preference == "EB3":
-            spillover_list = spillover_list * np.random.uniform(m.EB3_SPILLOVER_LOWER_BOUND, m.EB3_SPILLOVER_UPPER_BOUND)
+            spillover_list = spillover_list * self.rng.uniform(m.EB3_SPILLOVER_LOWER_BOUND, m.EB3_SPILLOVER_UPPER_BOUND)
         # Use macros for stochastic distributions
-        dependancy_ratio = np.random.triangular(
+        dependancy_ratio = self.rng.triangular(
             left=m.DEP_RATIO_LEFT, 
             right=m.DEP_RATIO_RIGHT, 
             mode=m.DEP_RATIO_MODE
         )
-        duplicate_rate = np.random.uniform(
+        duplicate_rate = self.rng.uniform(
             m.DUPLICATE_RATE_MIN, 
             m.DUPLICATE_RATE_MAX
         )
         attrition_rates = [
-            np.random.uniform(m.ATTRITION_MIN, m.ATTRITION_MAX) 
+            self.rng.uniform(m.ATTRITION_MIN, m.ATTRITION_MAX) 
             for _ in range(self.n_years)
         ]
 
         return base_quota, spillover_list, attrition_rates, dependancy_ratio, duplicate_rate
 
-    def gen_people_ahead(self, inv, last_inv_d):
-        if m.WANT_BULLETIN:
-            inv = inv[inv["Date"] > self.visa_bulletin_date]
+    def gen_people_ahead(self, backlog, last_inv_d):
+        after = self.visa_bulletin_date if m.WANT_BULLETIN else None
         if self.target_date < last_inv_d:
             self.hidden = False
-            people_ahead = inv[inv["Date"] < self.target_date]["Count"].sum()
+            people_ahead = backlog.people_between(after, self.target_date)
             return people_ahead
-        people_ahead = inv["Count"].sum()
+        people_ahead = backlog.people_between(after)
         return people_ahead
 
     def gen_i140_count(self, last_inv_d, dupl, dep):
-        gap_days = (self.i140_inventory_date - last_inv_d).days
-        gap_pos_days = (self.target_date - last_inv_d).days
-        pct_in_gap = min(gap_pos_days / gap_days, 1.0)
+        pct_in_gap = gap_fraction(self.target_date, last_inv_d, self.i140_inventory_date)
 
-        i140_count = self.vdp.get_i140_snapshot() * pct_in_gap * (1 - dupl) * dep
+        i140_count = self.i140_snapshot * pct_in_gap * (1 - dupl) * dep
 
         return i140_count
+
+    def gen_people_ahead_curve(self, backlog, last_inv_d, target_dates):
+        after = self.visa_bulletin_date if m.WANT_BULLETIN else None
+        hidden = target_dates >= last_inv_d
+        people_ahead = np.where(hidden, backlog.people_between(after), backlog.people_between(after, target_dates))
+        pct_in_gap = backlog.gap_fraction(target_dates, self.i140_inventory_date)
+        return people_ahead, pct_in_gap
         
-    def monte_carlo(self):
-        eb_inventory = self.vdp.flatten()
-        eb_inventory = eb_inventory[
-            (eb_inventory[m.COL_STATUS] == "Awaiting Availability")
-            & (eb_inventory[m.COL_COUNTRY] == self.country)
-            & (eb_inventory[m.COL_PREF].str.contains(self.preference))
-            & (eb_inventory["Count"] > 0)
-        ].sort_values("Date")
+    def gen_sim_parameters_batch(self, n, rng=None, method="random", params=None):
+        rng = self.rng if rng is None else rng
+        base_quota = self.total_greencards * self.country_cap * self.category_preference
+        u = sampling.draw_uniforms(rng, n, sampling.uniform_dimensions(self.n_years), method)
+        return sampling.transform_uniforms(u, self.n_years, self.preference, base_quota, params)
+
+    def clearing_schedule(self, supply, attr):
+        # After attrition, the backlog at the start of year k is
+        # B_k = P_k * (people_ahead - C_k) where P_k = prod_{j<=k} (1 - attr_j)
+        # and C_k = sum_{j<k} supply_j / P_j, so a sim clears its backlog in the
+        # first year k whose supply exceeds B_k, i.e. the first k with C_{k+1} > people_ahead.
+        keep = np.cumprod(1 - attr, axis=1)
+        cleared = np.cumsum(supply / keep, axis=1)
+        return keep, cleared
+
+    def years_to_clear(self, people_ahead, supply, attr, schedule=None):
+        people_ahead = np.broadcast_to(np.asarray(people_ahead, dtype=float), supply.shape[:1])
+        keep, cleared = schedule if schedule is not None else self.clearing_schedule(supply, attr)
+        crossed = cleared > people_ahead[:, None]
+        year = crossed.argmax(axis=1)
+        rows = np.arange(len(year))
+
+        before = np.where(year > 0, cleared[rows, year - 1], 0.0)
+        backlog = keep[rows, year] * (people_ahead - before)
+        results = year + backlog / supply[rows, year]
+
+        # Past the last drawn year the loop engine keeps reusing the final year's draws.
+        idx = np.flatnonzero(~crossed[:, -1])
+        if idx.size:
+            last = self.n_years - 1
+            before = cleared[idx, last - 1] if last > 0 else 0.0
+            backlog = keep[idx, last] * (people_ahead[idx] - before)
+            s = supply[idx, last]
+            r = 1 - attr[idx, last]
+            year = last
+            while idx.size:
+                backlog = (backlog - s) * r
+                year += 1
+                hit = s > backlog
+                results[idx[hit]] = year + backlog[hit] / s[hit]
+                idx, backlog, s, r = idx[~hit], backlog[~hit], s[~hit], r[~hit]
+        return results
+
+    def capacity(self, years, supply, attr, schedule=None):
+        # People each sim clears within `years` (up to n_years): inverting years_to_clear,
+        # K(t) = C_k + (t - k) * s_k / P_k with k = floor(t), so a wait is at most t
+        # exactly when people_ahead <= K(t). One column per entry of `years`.
+        keep, cleared = schedule if schedule is not None else self.clearing_schedule(supply, attr)
+        years = np.atleast_1d(np.asarray(years, dtype=float))
+        if years.max() > self.n_years:
+            raise ValueError(f"capacity is only defined up to n_years={self.n_years}")
+        k = np.minimum(np.floor(years).astype(int), self.n_years - 1)
+        before = np.where(k > 0, cleared[:, np.maximum(k - 1, 0)], 0.0)
+        return before + (years - k) * supply[:, k] / keep[:, k]
+
+    def iter_result_chunks(self, people_ahead_sim, last_inv_date, chunk_size=m.CHUNK_SIZE, sims=None, rng=None):
+        sims = self.sims if sims is None else sims
+        for start in range(0, sims, chunk_size):
+            n = min(chunk_size, sims - start)
+            yield self.results_from_parameters(people_ahead_sim, last_inv_date, self.gen_sim_parameters_batch(n, rng))
+
+    def results_from_parameters(self, people_ahead_sim, last_inv_date, parameters):
+        quota, spillovers, attr, dep, dupl = parameters
+        people_ahead = np.full(len(dep), float(people_ahead_sim))
+        if self.hidden:
+            people_ahead += self.gen_i140_count(last_inv_date, dupl, dep)
+        return self.years_to_clear(people_ahead, quota + spillovers, attr)
+
+    def monte_carlo_vectorized(self, people_ahead_sim, last_inv_date, chunk_size=m.CHUNK_SIZE):
+        results = np.empty(self.sims)
+        start = 0
+        for chunk in self.iter_result_chunks(people_ahead_sim, last_inv_date, chunk_size):
+            results[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        return results
+
+    def monte_carlo_summary(self, prob_tolerance=None, p95_tolerance=None, year_limit=m.YEAR_LIMIT, chunk_size=m.SUMMARY_CHUNK_SIZE):
+        # Streams chunks of results into a fixed-memory summary. With a tolerance set,
+        # stops as soon as the confidence half-widths on the probability of waiting less
+        # than year_limit and on P95 are within it; self.sims is then only the budget.
+        summary = SimulationSummary(year_limit=year_limit)
+        backlog, last_inv_date = self.load_inventory()
+
+        if self.target_date < self.visa_bulletin_date:
+            return summary.update(np.zeros(self.sims))
+
+        early_stop = prob_tolerance is not None or p95_tolerance is not None
+        people_ahead_sim = self.gen_people_ahead(backlog, last_inv_date)
+        # Each span covers drawing and simulating the chunk as well as folding it in.
+        chunks = self.iter_result_chunks(people_ahead_sim, last_inv_date, chunk_size)
+        for start in range(0, self.sims, chunk_size):
+            with span("monte_carlo_summary.chunk", sims=min(chunk_size, self.sims - start)):
+                summary.update(next(chunks))
+                stop = early_stop and summary.converged(prob_tolerance, p95_tolerance)
+            if stop:
+                break
+        return summary
+
+    def monte_carlo_sampled(self, method=m.SAMPLING_METHOD, replicates=m.SAMPLING_REPLICATES, year_limit=m.YEAR_LIMIT):
+        # Runs self.sims (rounded up to whole power-of-2 blocks for Sobol) split over
+        # independent replicates of the sampling design and reports each estimate with
+        # a standard error from the replicate spread.
+        backlog, last_inv_date = self.load_inventory()
+        per_replicate = sampling.replicate_size(self.sims, replicates, method)
+
+        if self.target_date < self.visa_bulletin_date:
+            runs = [np.zeros(per_replicate) for _ in range(replicates)]
+        else:
+            people_ahead_sim = self.gen_people_ahead(backlog, last_inv_date)
+            runs = [
+                self.results_from_parameters(people_ahead_sim, last_inv_date, self.gen_sim_parameters_batch(per_replicate, method=method))
+                for _ in range(replicates)
+            ]
+        return np.concatenate(runs), sampling.replicate_report(runs, method, year_limit)
+
+    def compare(self, other, method=m.SAMPLING_METHOD, replicates=m.SAMPLING_REPLICATES, year_limit=m.YEAR_LIMIT):
+        # Common random numbers: both runs see the same uniforms, so the difference
+        # in each estimate (other - self) carries far less noise than two separate runs.
+        if other.n_years != self.n_years:
+            raise ValueError("Compared simulations must use the same n_years")
+        per_replicate = sampling.replicate_size(self.sims, replicates, method)
+        dim = sampling.uniform_dimensions(self.n_years)
+        uniforms = [sampling.draw_uniforms(self.rng, per_replicate, dim, method) for _ in range(replicates)]
+
+        runs = []
+        for sim in (self, other):
+            backlog, last_inv_date = sim.load_inventory()
+            base_quota = sim.total_greencards * sim.country_cap * sim.category_preference
+            if sim.target_date < sim.visa_bulletin_date:
+                runs.append([np.zeros(per_replicate) for _ in uniforms])
+                continue
+            people_ahead_sim = sim.gen_people_ahead(backlog, last_inv_date)
+            runs.append([
+                sim.results_from_parameters(people_ahead_sim, last_inv_date, sampling.transform_uniforms(u, sim.n_years, sim.preference, base_quota))
+                for u in uniforms
+            ])
 
-        last_inv_date = eb_inventory.iloc[-1]["Date"]
+        base = [sampling.estimates(r, year_limit) for r in runs[0]]
+        alt = [sampling.estimates(r, year_limit) for r in runs[1]]
+        report = {"method": method, "sims": per_replicate * replicates, "replicates": replicates}
+        for name in base[0]:
+            diffs = np.array([a[name] - b[name] for a, b in zip(alt, base)])
+            report[f"{name}_diff"] = float(diffs.mean())
+            report[f"{name}_diff_se"] = float(diffs.std(ddof=1) / np.sqrt(replicates)) if replicates > 1 else np.nan
+        return report
+
+    def sweep(self, grid, metric=None, year_limit=m.YEAR_LIMIT, min_ess=m.SWEEP_MIN_ESS):
+        # One-at-a-time sensitivity of the estimates to the stochastic macros. `grid`
+        # maps a macro name (or a tuple of names changed together) to alternative
+        # values. Every variant is answered from one base batch of draws, by
+        # likelihood-ratio reweighting when possible and otherwise by re-simulating
+        # the same uniforms under the variant (common random numbers). Rows come out
+        # tornado-ordered: parameters by the swing they cause in `metric`.
+        metric = f"prob_under_{year_limit:g}y" if metric is None else metric
+        base_params = sampling.stochastic_parameters()
+        base_quota = self.total_greencards * self.country_cap * self.category_preference
+        backlog, last_inv_date = self.load_inventory()
+        u = sampling.draw_uniforms(self.rng, self.sims, sampling.uniform_dimensions(self.n_years))
+
+        current = self.target_date < self.visa_bulletin_date
+        people_ahead_sim = 0.0 if current else self.gen_people_ahead(backlog, last_inv_date)
+
+        def simulate(params):
+            if current:
+                return np.zeros(self.sims)
+            parameters = sampling.transform_uniforms(u, self.n_years, self.preference, base_quota, params)
+            return self.results_from_parameters(people_ahead_sim, last_inv_date, parameters)
+
+        with span("sweep.base", sims=self.sims):
+            base_results = simulate(base_params)
+        base = sampling.estimates(base_results, year_limit)
+        crossing = np.minimum(np.floor(base_results).astype(int), self.n_years - 1)
+        years_used = np.arange(self.n_years)[None, :] <= crossing[:, None]
+        hidden = self.hidden and not current
+
+        rows = []
+        for key, values in grid.items():
+            names = key if isinstance(key, tuple) else (key,)
+            for value in values:
+                params = sampling.stochastic_parameters(**dict(zip(names, value if isinstance(key, tuple) else (value,))))
+                log_w = sampling.log_likelihood_ratio(u, self.n_years, self.preference, base_params, params, years_used, hidden)
+                ess = 0.0
+                if log_w is not None and np.isfinite(log_w).any():
+                    weights = np.exp(log_w - log_w[np.isfinite(log_w)].max())
+                    ess = sampling.effective_sample_size(weights)
+                if ess >= min_ess * self.sims:
+                    row = {"method": "reweight", "ess": ess, **sampling.weighted_estimates(base_results, weights, year_limit)}
+                else:
+                    with span("sweep.resimulate", sims=self.sims):
+                        row = {"method": "crn", "ess": float(self.sims), **sampling.estimates(simulate(params), year_limit)}
+                rows.append({"parameter": "+".join(names), "value": value, **row})
+
+        table = pd.DataFrame(rows)
+        for name in base:
+            table[f"{name}_change"] = table[name] - base[name]
+        swing = table.groupby("parameter")[f"{metric}_change"].agg(lambda c: max(c.max(), 0) - min(c.min(), 0))
+        table["swing"] = table["parameter"].map(swing)
+        table = table.sort_values("swing", ascending=False, kind="stable").reset_index(drop=True)
+        base_row = pd.DataFrame([{"parameter": "base", "value": None, "method": "base", "ess": float(self.sims), **base}])
+        return pd.concat([base_row, table], ignore_index=True)
+
+    def inverse_query(self, years=m.YEAR_LIMIT, confidences=m.INVERSE_CONFIDENCES, chunk_size=m.CHUNK_SIZE):
+        # Both inverse questions from one batch of draws (the cost of one forward run),
+        # one row per confidence q:
+        #   years_needed: the wait at target_date that holds with probability q;
+        #   latest_pd_{Y}y: the latest priority date that clears within Y years with
+        #   probability q. NaT means every date the data covers does.
+        # The latest date comes from the (1 - q) quantile of the per-sim capacity K(Y),
+        # mapped back through the cumulative backlog; past the last inventory month the
+        # hidden I-140 share differs per sim, so each sim's largest gap fraction is
+        # solved for instead.
+        years = np.atleast_1d(np.asarray(years, dtype=float))
+        confidences = np.atleast_1d(np.asarray(confidences, dtype=float))
+        backlog, last_inv_date = self.load_inventory()
+        after = self.visa_bulletin_date if m.WANT_BULLETIN else None
+        visible = backlog.people_between(after)
+
+        current = self.target_date < self.visa_bulletin_date
+        hidden = self.target_date >= last_inv_date
+        people_ahead = visible if hidden else backlog.people_between(after, self.target_date)
+        target_gap = gap_fraction(self.target_date, last_inv_date, self.i140_inventory_date) if hidden else 0.0
+
+        capacity, scale, results = [], [], []
+        with span("inverse_query.simulate", sims=self.sims):
+            for start in range(0, self.sims, chunk_size):
+                n = min(chunk_size, self.sims - start)
+                quota, spillovers, attr, dep, dupl = self.gen_sim_parameters_batch(n)
+                supply = quota + spillovers
+                schedule = self.clearing_schedule(supply, attr)
+                i140_scale = self.i140_snapshot * (1 - dupl) * dep
+                capacity.append(self.capacity(years, supply, attr, schedule))
+                scale.append(i140_scale)
+                if not current:
+                    results.append(self.years_to_clear(people_ahead + target_gap * i140_scale, supply, attr, schedule))
+        capacity, scale = np.concatenate(capacity), np.concatenate(scale)
+        results = np.concatenate(results) if results else np.zeros(self.sims)
+
+        # The k-th smallest value that still leaves a share q of sims at or above it.
+        ranks = np.minimum(np.floor((1 - confidences) * self.sims).astype(int), self.sims - 1)
+        gap_days = (self.i140_inventory_date - last_inv_date).days
+        table = pd.DataFrame(index=pd.Index(confidences, name="confidence"))
+        table["years_needed"] = np.quantile(results, confidences)
+        for j, limit in enumerate(years):
+            threshold = np.sort(capacity[:, j])[ranks]
+            latest = []
+            for people, rank in zip(threshold, ranks):
+                if people < visible:
+                    date = backlog.latest_date(people, after)
+                else:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        share = np.where(scale > 0, (capacity[:, j] - visible) / scale, np.inf)
+                    share = np.sort(share)[rank]
+                    date = None if share >= 1 else last_inv_date + pd.Timedelta(days=int(np.floor(share * gap_days)))
+                if date is not None:
+                    date = max(date, self.visa_bulletin_date - pd.Timedelta(days=1))
+                latest.append(pd.NaT if date is None else date)
+            table[f"latest_pd_{limit:g}y"] = pd.to_datetime(latest)
+        return table
+
+    def monte_carlo_sharded(self, workers=m.WORKERS, shard_size=m.SHARD_SIZE, year_limit=m.YEAR_LIMIT):
+        # Shards are fixed by sims and shard_size and each gets its own stream spawned
+        # from the seed, then summaries merge in shard order, so the result is
+        # bit-identical for a given seed whatever the number of workers.
+        summary = SimulationSummary(year_limit=year_limit)
+        backlog, last_inv_date = self.load_inventory()
+
+        if self.target_date < self.visa_bulletin_date:
+            return summary.update(np.zeros(self.sims))
+
+        people_ahead_sim = self.gen_people_ahead(backlog, last_inv_date)
+        sizes = [min(shard_size, self.sims - start) for start in range(0, self.sims, shard_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        jobs = [(self, people_ahead_sim, last_inv_date, seq, n, year_limit) for seq, n in zip(seeds, sizes)]
+
+        with span("monte_carlo_sharded", sims=self.sims):
+            if workers == 1 or len(jobs) == 1:
+                return self._merge_shards(summary, map(_run_shard, jobs))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return self._merge_shards(summary, pool.map(_run_shard, jobs))
+
+    def _merge_shards(self, summary, shards):
+        for shard in shards:
+            summary.merge(shard)
+        return summary
+
+    def wait_time_curve(self, target_dates, quantiles=(0.5, 0.95), years=m.YEAR_LIMIT, chunk_size=m.CHUNK_SIZE, with_summaries=False):
+        target_dates = pd.DatetimeIndex(pd.to_datetime(target_dates))
+        backlog, last_inv_date = self.load_inventory()
+        people_ahead, pct_in_gap = self.gen_people_ahead_curve(backlog, last_inv_date, target_dates)
+        current = np.asarray(target_dates < self.visa_bulletin_date)
+
+        # One set of draws per chunk is shared by every target date.
+        results = np.zeros((len(target_dates), self.sims))
+        with span("wait_time_curve.simulate", sims=self.sims * len(target_dates)):
+            for start in range(0, self.sims, chunk_size):
+                n = min(chunk_size, self.sims - start)
+                quota, spillovers, attr, dep, dupl = self.gen_sim_parameters_batch(n)
+                supply = quota + spillovers
+                schedule = self.clearing_schedule(supply, attr)
+                i140_scale = self.i140_snapshot * (1 - dupl) * dep
+                for i in np.flatnonzero(~current):
+                    people = people_ahead[i] + pct_in_gap[i] * i140_scale
+                    results[i, start:start + n] = self.years_to_clear(people, supply, attr, schedule)
+
+        table = pd.DataFrame(index=pd.Index(target_dates, name="target_date"))
+        table["people_ahead"] = people_ahead
+        for q in quantiles:
+            table[f"p{q * 100:g}"] = np.quantile(results, q, axis=1)
+        table[f"prob_under_{years:g}y"] = (results < years).mean(axis=1)
+        if with_summaries:
+            return table, [SimulationSummary(year_limit=years).update(row) for row in results]
+        return table
+
+    def load_inventory(self):
+        compact = self.vdp.compact_inventory()
+        with span("monte_carlo.filter"):
+            backlog = compact.index(self.country, self.preference)
+        return backlog, backlog.last_date
+
+    def monte_carlo(self, engine=m.ENGINE, chunk_size=m.CHUNK_SIZE):
+        backlog, last_inv_date = self.load_inventory()
 
         if self.target_date < self.visa_bulletin_date:
             return [0.0] * self.sims
 
+        people_ahead_sim = self.gen_people_ahead(backlog, last_inv_date)
+        if engine not in ("vectorized", "loop", "analytic"):
+            raise ValueError(f"Unknown engine: {engine}")
+        with span(f"monte_carlo.{engine}", sims=self.sims):
+            if engine == "vectorized":
+                return self.monte_carlo_vectorized(people_ahead_sim, last_inv_date, chunk_size)
+            if engine == "analytic":
+                # Stratified quantiles of the exact-up-to-discretization CDF stand in for draws.
+                t_grid, cdf, _ = self.analytic_distribution(people_ahead_sim, last_inv_date)
+                return analytic.quantile_samples(t_grid, cdf, self.sims)
+            return self.monte_carlo_loop(people_ahead_sim, last_inv_date)
+
+    def wait_time_distribution(self):
+        # (t_grid, cdf, bound) from the semi-analytic engine; see analytic.py for the bound.
+        backlog, last_inv_date = self.load_inventory()
+        if self.target_date < self.visa_bulletin_date:
+            return np.array([0.0]), np.array([1.0]), 0.0
+        return self.analytic_distribution(self.gen_people_ahead(backlog, last_inv_date), last_inv_date)
+
+    def analytic_distribution(self, people_ahead_sim, last_inv_date):
+        base_quota = self.total_greencards * self.country_cap * self.category_preference
+        i140_scale = 0.0
+        if self.hidden:
+            i140_scale = self.i140_snapshot * gap_fraction(self.target_date, last_inv_date, self.i140_inventory_date)
+        with span("analytic.wait_time_distribution"):
+            return analytic.wait_time_distribution(float(people_ahead_sim), float(i140_scale), base_quota, self.preference, self.n_years)
+
+    def monte_carlo_loop(self, people_ahead_sim, last_inv_date):
+        from tqdm import tqdm
         results = []
-        people_ahead_sim = self.gen_people_ahead(eb_inventory, last_inv_date)
         for _ in tqdm(range(self.sims), desc="running monte carlo simulations"):
             quota, spillovers, attr, dep, dupl = self.gen_sim_parameters()
             people_ahead = people_ahead_sim
@@ -128,30 +500,22 @@ class MonteCarloVisaSimulation:
 
         return results
     def calculate_probability(self, results, years):
-        count = 0
-        result_size = len(results)
-        if result_size == 0:
-            return 0.0
-        for i in range(result_size):
-            if results[i] < years:
-                count += 1
-        prob = count / result_size * 100
+        if isinstance(results, SimulationSummary):
+            if results.count == 0:
+                return 0.0
+            prob = results.probability_below(years) * 100
+        else:
+            if len(results) == 0:
+                return 0.0
+            prob = np.mean(np.asarray(results) < years) * 100
         print(f"The probability that you will wait less than {years} years is {prob:.2f}% for an {self.preference} {self.country} national with a priority date of {self.target_date}")
-    def plot_histogram(self, results):
-        p50 = np.percentile(results, 50)
-        p95 = np.percentile(results, 95)
-        plt.style.use("dark_background")
-        plt.figure(figsize=m.HIST_FIGSIZE)
-
-        sns.histplot(results, bins=m.HIST_BINS, edgecolor=m.HIST_COLOR_EDGE, alpha=0.85, kde=True)
-        plt.axvline(p50, color=m.HIST_COLOR_MEDIAN, linestyle="-", linewidth=2, label=f"Median (50%): {p50:.1f} years")
-        plt.axvline(p95, color=m.HIST_COLOR_95, linestyle="--", linewidth=2, label=f"95%: {p95:.1f} years")
-
-        plt.xlabel("Years Passed")
-        plt.ylabel("Monte Carlo Frequency")
-        plt.title("Monte Carlo Simulation")
-
-        plt.grid(True, axis="y", alpha=0.35)
-        plt.legend()
-        plt.savefig(f"{m.IMG_DIR}/{m.HISTOGRAM_FILE}")
-        plt.show()
\ No newline at end of file
+        return prob
+    def plot_histogram(self, results, renderer=None, show=True):
+        # Draws from the binned summary; with a ChartRenderer the chart is rendered in
+        # the background and a Future for the saved path is returned.
+        summary = results if isinstance(results, SimulationSummary) else SimulationSummary().update(results)
+        chart = rendering.histogram_chart(summary, f"{m.IMG_DIR}/{m.HISTOGRAM_FILE}")
+        if renderer is not None:
+            return renderer.submit(chart)
+        with span("plot_histogram.render"):
+            return rendering.render(chart, show=show)
@@ -0,0 +1,196 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+import macros as m
+from compact_inventory import AWAITING
+
+# Charts are described by small payloads (histogram bins, KDE curves and quantiles
+# precomputed from a SimulationSummary) and drawn with matplotlib's object-oriented
+# API on the Agg backend. ChartRenderer draws them in worker processes, so a batch
+# can queue hundreds of charts and carry on delivering results; matplotlib is only
+# imported where a chart is actually drawn.
+
+
+def histogram_chart(summary, path, bins=m.HIST_BINS, title="Monte Carlo Simulation"):
+    counts, edges = summary.histogram(bins)
+    x, density = summary.kde()
+    return {
+        "kind": "histogram",
+        "path": path,
+        "style": "dark_background",
+        "figsize": m.HIST_FIGSIZE,
+        "title": title,
+        "counts": counts,
+        "edges": edges,
+        # seaborn's histplot scales the KDE to the bar counts.
+        "kde": (x, density * summary.count * (edges[1] - edges[0])),
+        "p50": summary.quantile(0.5),
+        "p95": summary.quantile(0.95),
+    }
+
+
+def safety_chart(summary, mode, color, target_pd, path, bins=40):
+    counts, edges = summary.histogram(bins)
+    return {
+        "kind": "safety",
+        "path": path,
+        "figsize": (10, 6),
+        "mode": mode,
+        "color": color,
+        "target_pd": target_pd,
+        "counts": counts,
+        "edges": edges,
+        "density": counts / max(summary.count, 1) / (edges[1] - edges[0]),
+        "p50": summary.quantile(0.5),
+        "p90": summary.quantile(0.9),
+    }
+
+
+def combined_ci_chart(scenarios, target_pd, path):
+    # scenarios: (label, color, summary) per curve.
+    curves = []
+    for label, color, summary in scenarios:
+        curves.append({
+            "label": label,
+            "color": color,
+            "kde": summary.kde(),
+            "lower": summary.quantile(0.025),
+            "median": summary.quantile(0.5),
+            "upper": summary.quantile(0.975),
+        })
+    return {"kind": "combined_ci", "path": path, "figsize": (14, 8), "target_pd": target_pd, "curves": curves}
+
+
+def line_chart(compact, country, preference_range, path):
+    lines = []
+    for pref, color in preference_range.items():
+        months, counts = compact.series(country, pref, AWAITING)
+        if len(months):
+            lines.append({"label": f"{pref.lower()}-backlog", "color": color, "x": months.astype("datetime64[D]"), "y": counts})
+    return {"kind": "line", "path": path, "figsize": (12, 6), "country": country, "lines": lines}
+
+
+def _draw_histogram(ax, chart):
+    edges = chart["edges"]
+    ax.bar(edges[:-1], chart["counts"], width=np.diff(edges), align="edge", edgecolor=m.HIST_COLOR_EDGE, alpha=0.85, color=m.HIST_COLOR_BAR)
+    ax.plot(*chart["kde"], color=m.HIST_COLOR_BAR, linewidth=1.5)
+    ax.axvline(chart["p50"], color=m.HIST_COLOR_MEDIAN, linestyle="-", linewidth=2, label=f"Median (50%): {chart['p50']:.1f} years")
+    ax.axvline(chart["p95"], color=m.HIST_COLOR_95, linestyle="--", linewidth=2, label=f"95%: {chart['p95']:.1f} years")
+    ax.set_xlabel("Years Passed")
+    ax.set_ylabel("Monte Carlo Frequency")
+    ax.set_title(chart["title"])
+    ax.grid(True, axis="y", alpha=0.35)
+    ax.legend()
+
+
+def _draw_safety(ax, chart):
+    edges = chart["edges"]
+    ax.bar(edges[:-1], chart["density"], width=np.diff(edges), align="edge", color=chart["color"], alpha=0.7, edgecolor="black")
+    ax.axvline(chart["p90"], color="black", linestyle="--", linewidth=2, label=f"90% Safe Limit: {chart['p90']:.1f} Years")
+    ax.set_title(f"{chart['mode']} Scenario: Safety Analysis\n(Priority Date: {chart['target_pd']})", fontsize=14)
+    ax.set_xlabel("Years to Wait", fontsize=12)
+    ax.set_ylabel("Density", fontsize=12)
+    stats_text = f"Median Wait: {chart['p50']:.1f} yrs\n90% Chance Complete by: {chart['p90']:.1f} yrs"
+    ax.text(0.65, 0.85, stats_text, transform=ax.transAxes, fontsize=12, verticalalignment="top",
+            bbox=dict(boxstyle="round", facecolor="white", alpha=0.8))
+    ax.legend(loc="upper right")
+    ax.grid(axis="y", alpha=0.3)
+
+
+def _draw_combined_ci(ax, chart):
+    for curve in chart["curves"]:
+        x, y = curve["kde"]
+        ax.fill_between(x, y, color=curve["color"], alpha=0.3, label=curve["label"])
+        ax.plot(x, y, color=curve["color"])
+    ymax = ax.get_ylim()[1]
+    for curve in chart["curves"]:
+        color = curve["color"]
+        ax.axvline(curve["lower"], color=color, linestyle="--", linewidth=2, ymax=0.95)
+        ax.axvline(curve["upper"], color=color, linestyle="--", linewidth=2, ymax=0.95)
+        ax.axvline(curve["median"], color=color, linestyle="-", linewidth=2, ymax=0.95)
+        ax.text(curve["median"], ymax * 0.97, f"{curve['median']:.1f}y", color=color, ha="center", fontweight="bold",
+                bbox=dict(facecolor="white", alpha=0.6, edgecolor="none"))
+    ax.set_title(f"Master Analysis: 95% Confidence Intervals\nTarget PD: {chart['target_pd']}", fontsize=16)
+    ax.set_xlabel("Years to Wait", fontsize=12)
+    ax.set_ylabel("Density", fontsize=12)
+    ax.legend()
+    ax.grid(axis="y", alpha=0.3)
+
+
+def _draw_line(ax, chart):
+    for line in chart["lines"]:
+        ax.plot(line["x"], line["y"], label=line["label"], color=line["color"], linewidth=2)
+    ax.set_title(f"{chart['country']} Priority Date Inventory (Line)")
+    ax.set_xlabel("Priority Date")
+    ax.set_ylabel("Number of people waiting")
+    ax.legend()
+    ax.grid(True, linestyle="--", alpha=0.6)
+
+
+DRAWERS = {
+    "histogram": _draw_histogram,
+    "safety": _draw_safety,
+    "combined_ci": _draw_combined_ci,
+    "line": _draw_line,
+}
+
+
+def render(chart, show=False):
+    # Saves the chart and returns its path. With show=True the figure comes from
+    # pyplot so it can also be displayed; otherwise no GUI backend is touched.
+    import matplotlib.style
+    with matplotlib.style.context(chart.get("style", "default")):
+        if show:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize=chart["figsize"])
+        else:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(figsize=chart["figsize"])
+            FigureCanvasAgg(fig)
+        DRAWERS[chart["kind"]](fig.add_subplot(), chart)
+        directory = os.path.dirname(chart["path"])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fig.savefig(chart["path"])
+    if show:
+        plt.show()
+        plt.close(fig)
+    return chart["path"]
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+class ChartRenderer:
+    # Background rendering: submit() returns a Future for the saved path right away.
+    # workers=0 renders inline (the Future is already done).
+    def __init__(self, workers=m.RENDER_WORKERS):
+        self.workers = workers
+        self.pool = None
+
+    def submit(self, chart):
+        if self.workers == 0:
+            future = Future()
+            future.set_result(render(chart))
+            return future
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self.pool.submit(render, chart)
+
+    def render_all(self, charts):
+        futures = [self.submit(chart) for chart in charts]
+        return [future.result() for future in futures]
+
+    def close(self, wait=True):
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,182 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import macros as m
+import data_cache
+import sampling
+from simulation_summary import SimulationSummary
+
+# Bump when the layout of cached entries changes.
+RESULT_CACHE_VERSION = 2
+
+
+def data_listing():
+    # Any workbook added to, replaced in or removed from data/ changes every key.
+    listing = []
+    for path in sorted(glob.glob(os.path.join(m.DATA_DIR, "*.xlsx"))):
+        stat = os.stat(path)
+        listing.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return listing
+
+
+def simulation_key(sim, engine, year_limit):
+    i140_file = os.path.join(m.DATA_DIR, m.I140_FILE)
+    payload = {
+        "version": RESULT_CACHE_VERSION,
+        "inventory": data_cache.file_fingerprint(sim.file_path),
+        "i140": data_cache.file_fingerprint(i140_file) if os.path.exists(i140_file) else None,
+        "data": data_listing(),
+        "parse_macros": {name: getattr(m, name) for name in data_cache.PARSE_MACROS},
+        "stochastic": sampling.stochastic_parameters(),
+        "want_bulletin": m.WANT_BULLETIN,
+        "country": sim.country,
+        "preference": sim.preference,
+        "target_date": sim.target_date,
+        "visa_bulletin_date": sim.visa_bulletin_date,
+        "i140_inventory_date": sim.i140_inventory_date,
+        "i140_snapshot": sim.i140_snapshot,
+        "total_greencards": sim.total_greencards,
+        "country_cap": sim.country_cap,
+        "category_preference": sim.category_preference,
+        "n_years": sim.n_years,
+        "sims": sim.sims,
+        "seed": sim.requested_seed,
+        "engine": engine,
+        "analytic": [m.ANALYTIC_GRID, m.ANALYTIC_STEPS_PER_YEAR, m.ANALYTIC_NODES, m.ANALYTIC_TOLERANCE] if engine == "analytic" else None,
+        "year_limit": year_limit,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    # Summary statistics (and optionally the raw results) per simulation key. Lookups
+    # go to the in-memory LRU first, then to .npz files on disk; the disk tier evicts
+    # least recently used files once it grows past max_bytes.
+    def __init__(self, directory=m.RESULT_CACHE_DIR, max_entries=m.RESULT_CACHE_ENTRIES, max_bytes=m.RESULT_CACHE_MAX_MB * 2 ** 20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "memory_evictions": 0, "disk_evictions": 0}
+
+    def _file(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _remember(self, key, entry):
+        # Entries are shared between callers, so the cached arrays are made read-only.
+        if entry["results"] is not None:
+            entry["results"].flags.writeable = False
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def get(self, key, need_results=False):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and (entry["results"] is not None or not need_results):
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry
+            entry = self._read(key)
+            if entry is not None and (entry["results"] is not None or not need_results):
+                self._remember(key, entry)
+                self.stats["disk_hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+            return None
+
+    def _read(self, key):
+        file = self._file(key)
+        try:
+            with np.load(file, allow_pickle=False) as data:
+                entry = {
+                    "summary": json.loads(str(data["summary"])),
+                    "results": data["results"] if "results" in data.files else None,
+                    "seed": int(str(data["seed"])),
+                }
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(file)
+        return entry
+
+    def put(self, key, summary, results=None, seed=None):
+        # seed: the entropy that produced the entry, so a hit can report it.
+        entry = {"summary": summary, "results": None if results is None else np.array(results, dtype=float), "seed": seed}
+        arrays = {"summary": np.array(json.dumps(summary, default=float)), "seed": np.array(str(seed))}
+        if entry["results"] is not None:
+            arrays["results"] = entry["results"]
+        with self.lock:
+            self._remember(key, entry)
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{self._file(key)}.tmp.npz"
+            np.savez(tmp, **arrays)
+            os.replace(tmp, self._file(key))
+            self.stats["stores"] += 1
+            self._evict_disk()
+        return entry
+
+    def _evict_disk(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz") and ".tmp" not in name:
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            self.stats["disk_evictions"] += 1
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self.memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else None
+        return stats
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith(".npz"):
+                        os.remove(os.path.join(self.directory, name))
+
+
+_default = {}
+
+
+def default_cache():
+    if "cache" not in _default:
+        _default["cache"] = ResultCache()
+    return _default["cache"]
+
+
+def cached_monte_carlo(sim, engine=m.ENGINE, chunk_size=m.CHUNK_SIZE, year_limit=m.YEAR_LIMIT, cache=None, store_results=m.RESULT_CACHE_STORE_RESULTS):
+    # Returns (results, summary); results is None when only the summary was kept.
+    if not m.USE_RESULT_CACHE:
+        results = np.asarray(sim.monte_carlo(engine=engine, chunk_size=chunk_size), dtype=float)
+        return results, SimulationSummary(year_limit=year_limit).update(results).as_dict()
+    cache = default_cache() if cache is None else cache
+    key = simulation_key(sim, engine, year_limit)
+    entry = cache.get(key, need_results=store_results)
+    if entry is None:
+        results = np.asarray(sim.monte_carlo(engine=engine, chunk_size=chunk_size), dtype=float)
+        summary = SimulationSummary(year_limit=year_limit).update(results).as_dict()
+        entry = cache.put(key, summary, results if store_results else None, seed=sim.seed)
+    else:
+        # Unseeded runs share one entry; report the seed that actually produced it and
+        # leave the generator where a fresh run from that seed would start.
+        sim.seed = entry["seed"]
+        sim.rng = np.random.default_rng(sim.seed)
+    return entry["results"], entry["summary"]
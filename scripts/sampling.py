@@ -0,0 +1,215 @@
+import numpy as np
+import macros as m
+
+SAMPLING_METHODS = ("random", "antithetic", "lhs", "sobol")
+
+# Every stochastic constant in macros.py that feeds the draws.
+STOCHASTIC_MACROS = (
+    "SPILLOVER_RANGES",
+    "SPILLOVER_PROBS",
+    "EB3_SPILLOVER_LOWER_BOUND",
+    "EB3_SPILLOVER_UPPER_BOUND",
+    "DEP_RATIO_LEFT",
+    "DEP_RATIO_RIGHT",
+    "DEP_RATIO_MODE",
+    "DUPLICATE_RATE_MIN",
+    "DUPLICATE_RATE_MAX",
+    "ATTRITION_MIN",
+    "ATTRITION_MAX",
+)
+
+
+def stochastic_parameters(**overrides):
+    params = {name: getattr(m, name) for name in STOCHASTIC_MACROS}
+    unknown = set(overrides) - set(params)
+    if unknown:
+        raise ValueError(f"Unknown stochastic parameters: {sorted(unknown)}")
+    params.update(overrides)
+    return params
+
+
+def uniform_dimensions(n_years):
+    # Per sim: scenario and within-range position for every year, the EB3 spillover
+    # share, the dependency ratio, the duplicate rate and an attrition rate per year.
+    return 3 * n_years + 3
+
+
+def replicate_size(sims, replicates, method="random"):
+    # Sims per replicate; Sobol points only stay balanced in power-of-2 blocks.
+    n = -(-sims // replicates)
+    if method == "sobol":
+        n = 1 << max(n - 1, 0).bit_length()
+    return n
+
+
+def draw_uniforms(rng, n, dim, method="random"):
+    if method == "random":
+        return rng.random((n, dim))
+    if method == "antithetic":
+        # Pairs (u, 1 - u) sit next to each other so any prefix keeps them together.
+        half = rng.random(((n + 1) // 2, dim))
+        return np.stack([half, 1 - half], axis=1).reshape(-1, dim)[:n]
+    if method == "lhs":
+        strata = rng.permuted(np.tile(np.arange(n), (dim, 1)), axis=1).T
+        return (strata + rng.random((n, dim))) / n
+    if method == "sobol":
+        try:
+            from scipy.stats import qmc
+        except ImportError as e:
+            raise ImportError("Sobol sampling requires scipy (pip install scipy)") from e
+        if n < 1 or n & (n - 1):
+            raise ValueError(f"Sobol sampling needs a power-of-2 number of sims, got {n}")
+        return qmc.Sobol(d=dim, scramble=True, seed=rng).random_base2(int(n).bit_length() - 1)
+    raise ValueError(f"Unknown sampling method: {method}")
+
+
+def triangular_ppf(u, left, mode, right):
+    if right == left:
+        return np.full_like(u, left)
+    split = (mode - left) / (right - left)
+    lower = left + np.sqrt(u * (right - left) * (mode - left))
+    upper = right - np.sqrt((1 - u) * (right - left) * (right - mode))
+    return np.where(u < split, lower, upper)
+
+
+def transform_uniforms(u, n_years, preference, base_quota, params=None):
+    # Inverse-CDF transform of a (sims x uniform_dimensions) block into the same
+    # distributions gen_sim_parameters draws from.
+    params = stochastic_parameters() if params is None else params
+    scenario_u = u[:, :n_years]
+    position_u = u[:, n_years:2 * n_years]
+    eb3_u = u[:, 2 * n_years]
+    dep_u = u[:, 2 * n_years + 1]
+    dupl_u = u[:, 2 * n_years + 2]
+    attr_u = u[:, 2 * n_years + 3:]
+
+    bounds = np.array(list(params["SPILLOVER_RANGES"].values()))
+    cdf = np.cumsum(params["SPILLOVER_PROBS"])
+    choices = np.minimum(np.searchsorted(cdf / cdf[-1], scenario_u, side="right"), len(bounds) - 1)
+    lo = bounds[choices, 0]
+    width = bounds[choices, 1] - lo + 1
+    spillovers = lo + np.minimum(np.floor(position_u * width), width - 1)
+    if preference == "EB3":
+        eb3_lo, eb3_hi = params["EB3_SPILLOVER_LOWER_BOUND"], params["EB3_SPILLOVER_UPPER_BOUND"]
+        spillovers = spillovers * (eb3_lo + eb3_u * (eb3_hi - eb3_lo))[:, None]
+
+    dependancy_ratio = triangular_ppf(dep_u, params["DEP_RATIO_LEFT"], params["DEP_RATIO_MODE"], params["DEP_RATIO_RIGHT"])
+    duplicate_rate = params["DUPLICATE_RATE_MIN"] + dupl_u * (params["DUPLICATE_RATE_MAX"] - params["DUPLICATE_RATE_MIN"])
+    attrition_rates = params["ATTRITION_MIN"] + attr_u * (params["ATTRITION_MAX"] - params["ATTRITION_MIN"])
+    return base_quota, spillovers, attrition_rates, dependancy_ratio, duplicate_rate
+
+
+def _uniform_log_ratio(x, base_lo, base_hi, alt_lo, alt_hi):
+    if (alt_lo, alt_hi) == (base_lo, base_hi):
+        return np.zeros_like(x)
+    if alt_lo < base_lo or alt_hi > base_hi or alt_hi <= alt_lo:
+        return None
+    inside = (x >= alt_lo) & (x <= alt_hi)
+    return np.where(inside, np.log(base_hi - base_lo) - np.log(alt_hi - alt_lo), -np.inf)
+
+
+def _triangular_pdf(x, left, mode, right):
+    rising = np.where(mode > left, 2 * (x - left) / ((right - left) * max(mode - left, 1e-300)), 0.0)
+    falling = np.where(right > mode, 2 * (right - x) / ((right - left) * max(right - mode, 1e-300)), 0.0)
+    pdf = np.where(x < mode, rising, np.where(x > mode, falling, 2 / (right - left)))
+    return np.where((x < left) | (x > right), 0.0, pdf)
+
+
+def log_likelihood_ratio(u, n_years, preference, base, alt, years_used, hidden):
+    # Log weights alt/base for draws made from the uniform block u under `base`. Only
+    # draws that reach the result count: years up to the crossing year (years_used
+    # is a sims x n_years mask), the EB3 share for EB3, and the dependant ratio and
+    # duplicate rate when the hidden I-140 backlog is included. Returns None when alt
+    # puts mass where base has none (changed spillover ranges or a widened support),
+    # which reweighting cannot represent.
+    if list(alt["SPILLOVER_RANGES"].items()) != list(base["SPILLOVER_RANGES"].items()):
+        return None
+    log_w = np.zeros(len(u))
+
+    base_probs = np.asarray(base["SPILLOVER_PROBS"], dtype=float)
+    alt_probs = np.asarray(alt["SPILLOVER_PROBS"], dtype=float)
+    base_probs, alt_probs = base_probs / base_probs.sum(), alt_probs / alt_probs.sum()
+    if np.any((base_probs == 0) & (alt_probs > 0)):
+        return None
+    if not np.array_equal(base_probs, alt_probs):
+        choices = np.minimum(np.searchsorted(np.cumsum(base_probs), u[:, :n_years], side="right"), len(base_probs) - 1)
+        with np.errstate(divide="ignore"):
+            per_year = np.log(alt_probs)[choices] - np.log(base_probs)[choices]
+        log_w += np.where(years_used, per_year, 0.0).sum(axis=1)
+
+    attr = base["ATTRITION_MIN"] + u[:, 2 * n_years + 3:] * (base["ATTRITION_MAX"] - base["ATTRITION_MIN"])
+    ratio = _uniform_log_ratio(attr, base["ATTRITION_MIN"], base["ATTRITION_MAX"], alt["ATTRITION_MIN"], alt["ATTRITION_MAX"])
+    if ratio is None:
+        return None
+    log_w += np.where(years_used, ratio, 0.0).sum(axis=1)
+
+    if preference == "EB3":
+        lo, hi = base["EB3_SPILLOVER_LOWER_BOUND"], base["EB3_SPILLOVER_UPPER_BOUND"]
+        ratio = _uniform_log_ratio(lo + u[:, 2 * n_years] * (hi - lo), lo, hi, alt["EB3_SPILLOVER_LOWER_BOUND"], alt["EB3_SPILLOVER_UPPER_BOUND"])
+        if ratio is None:
+            return None
+        log_w += ratio
+
+    if hidden:
+        lo, hi = base["DUPLICATE_RATE_MIN"], base["DUPLICATE_RATE_MAX"]
+        ratio = _uniform_log_ratio(lo + u[:, 2 * n_years + 2] * (hi - lo), lo, hi, alt["DUPLICATE_RATE_MIN"], alt["DUPLICATE_RATE_MAX"])
+        if ratio is None:
+            return None
+        log_w += ratio
+
+        triangle = [base[k] for k in ("DEP_RATIO_LEFT", "DEP_RATIO_MODE", "DEP_RATIO_RIGHT")]
+        alt_triangle = [alt[k] for k in ("DEP_RATIO_LEFT", "DEP_RATIO_MODE", "DEP_RATIO_RIGHT")]
+        if alt_triangle != triangle:
+            if alt_triangle[0] < triangle[0] or alt_triangle[2] > triangle[2]:
+                return None
+            dep = triangular_ppf(u[:, 2 * n_years + 1], *triangle)
+            with np.errstate(divide="ignore"):
+                log_w += np.log(_triangular_pdf(dep, *alt_triangle)) - np.log(_triangular_pdf(dep, *triangle))
+    return log_w
+
+
+def effective_sample_size(weights):
+    return weights.sum() ** 2 / (weights ** 2).sum() if weights.any() else 0.0
+
+
+def _weighted_quantile(results, weights, q):
+    # Matches np.quantile's default (linear) definition when the weights are equal.
+    order = np.argsort(results)
+    r, w = results[order], weights[order]
+    cum = np.cumsum(w)
+    positions = (cum - w) / (cum[-1] - w[-1]) if cum[-1] > w[-1] else np.zeros_like(cum)
+    return float(np.interp(q, positions, r))
+
+
+def weighted_estimates(results, weights, year_limit=m.YEAR_LIMIT):
+    results = np.asarray(results, dtype=float)
+    weights = np.asarray(weights, dtype=float) / np.sum(weights)
+    return {
+        "mean": float((weights * results).sum()),
+        "p50": _weighted_quantile(results, weights, 0.5),
+        "p95": _weighted_quantile(results, weights, 0.95),
+        f"prob_under_{year_limit:g}y": float(weights[results < year_limit].sum()),
+    }
+
+
+def estimates(results, year_limit=m.YEAR_LIMIT):
+    results = np.asarray(results)
+    return {
+        "mean": float(results.mean()),
+        "p50": float(np.quantile(results, 0.5)),
+        "p95": float(np.quantile(results, 0.95)),
+        f"prob_under_{year_limit:g}y": float(np.mean(results < year_limit)),
+    }
+
+
+def replicate_report(replicates, method, year_limit=m.YEAR_LIMIT):
+    # Each replicate is an independent randomization of the chosen design, so the
+    # spread of the replicate estimates gives an honest standard error for every mode.
+    pooled = estimates(np.concatenate(replicates), year_limit)
+    per_replicate = [estimates(r, year_limit) for r in replicates]
+    report = {"method": method, "sims": int(sum(len(r) for r in replicates)), "replicates": len(replicates)}
+    for name, value in pooled.items():
+        values = np.array([e[name] for e in per_replicate])
+        report[name] = value
+        report[f"{name}_se"] = float(values.std(ddof=1) / np.sqrt(len(values))) if len(values) > 1 else np.nan
+    return report
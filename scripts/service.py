@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+from flatten_data import VisaDataProcessor, inventory_sheet, load_inventory_sheets, load_i140_table, lookup_i140_count
+from monte_carlo_visa_simulation import MonteCarloVisaSimulation
+from compact_inventory import CompactInventory
+import macros as m
+
+
+class ResidentInventory:
+    # Every sheet and the I-140 table parsed once into a compact inventory shared by
+    # one ready simulation per (country, preference).
+    def __init__(self, inventory_file, i140_file=None, sims=m.SERVICE_SIMS):
+        self.inventory_file = inventory_file
+        self.i140_file = i140_file
+        self.sims = sims
+        self.sheets = load_inventory_sheets(inventory_file)
+        self.compact = CompactInventory.from_sheets(self.sheets)
+        self.i140_table = load_i140_table(i140_file)
+        self.sims_by_key = {}
+        self.lock = threading.Lock()
+
+    def simulation(self, country, preference):
+        key = (country, preference)
+        with self.lock:
+            if key not in self.sims_by_key:
+                sheet = inventory_sheet(country, preference)
+                if sheet not in self.sheets or preference not in m.I140_PREF_MAP:
+                    raise KeyError(f"No inventory for {country} {preference}")
+                vdp = VisaDataProcessor(
+                    self.inventory_file,
+                    country,
+                    preference,
+                    inventory=self.sheets[sheet],
+                    i140_count=lookup_i140_count(self.i140_table, country, preference),
+                    compact=self.compact
+                )
+                sim = MonteCarloVisaSimulation(
+                    file_path=self.inventory_file,
+                    country=country,
+                    preference=preference,
+                    target_date=m.TARGET_DATE,
+                    visa_bulletin_date=m.VISA_BULLETIN_DATE,
+                    sims=self.sims,
+                    vdp=vdp
+                )
+                try:
+                    sim.load_inventory()
+                except IndexError:
+                    raise KeyError(f"No backlog awaiting availability for {country} {preference}")
+                self.sims_by_key[key] = sim
+            return self.sims_by_key[key]
+
+
+def _date_field(payload, name, default):
+    value = payload.get(name, default)
+    try:
+        date = pd.Timestamp(value) if isinstance(value, str) else pd.NaT
+    except ValueError:
+        date = pd.NaT
+    if pd.isna(date):
+        raise ValueError(f"{name} must be a date string, got {value!r}")
+    return str(date.date())
+
+
+def parse_query(payload):
+    # Malformed queries raise ValueError, which the handler answers with a 400.
+    if not isinstance(payload, dict):
+        raise ValueError(f"Each query must be a JSON object, got {payload!r}")
+    query = {}
+    for name, default in (("country", m.COUNTRY), ("preference", m.PREFERENCE)):
+        query[name] = payload.get(name, default)
+        if not isinstance(query[name], str):
+            raise ValueError(f"{name} must be a string, got {query[name]!r}")
+    query["target_date"] = _date_field(payload, "target_date", m.TARGET_DATE)
+    query["visa_bulletin_date"] = _date_field(payload, "visa_bulletin_date", m.VISA_BULLETIN_DATE)
+    years = payload.get("years", m.YEAR_LIMIT)
+    if isinstance(years, bool) or not isinstance(years, (int, float)) or not 0 < years < float("inf"):
+        raise ValueError(f"years must be a positive number, got {years!r}")
+    query["years"] = float(years)
+    return query
+
+
+class MicroBatcher:
+    # Collects queries for a short window and answers every query that shares a
+    # (country, preference, visa bulletin date, years) group with one vectorized
+    # wait_time_curve call over the group's distinct target dates.
+    def __init__(self, inventory, window=m.SERVICE_BATCH_WINDOW, max_batch=m.SERVICE_MAX_BATCH):
+        self.inventory = inventory
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, query):
+        future = Future()
+        self.pending.put((query, future))
+        return future
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for query, future in batch:
+                key = (query["country"], query["preference"], query["visa_bulletin_date"], query["years"])
+                groups.setdefault(key, []).append((query, future))
+            for key, items in groups.items():
+                try:
+                    self._answer(key, items)
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _answer(self, key, items):
+        country, preference, visa_bulletin_date, years = key
+        sim = self.inventory.simulation(country, preference)
+        sim.visa_bulletin_date = pd.Timestamp(visa_bulletin_date)
+        dates = sorted({query["target_date"] for query, _ in items})
+        table = sim.wait_time_curve(dates, years=years)
+        prob_col = f"prob_under_{years:g}y"
+        for query, future in items:
+            row = table.loc[pd.Timestamp(query["target_date"])]
+            future.set_result(dict(
+                query,
+                people_ahead=float(row["people_ahead"]),
+                p50=float(row["p50"]),
+                p95=float(row["p95"]),
+                probability=float(row[prob_col]),
+            ))
+
+
+class QueryService:
+    def __init__(self, inventory_file, i140_file=None, sims=m.SERVICE_SIMS):
+        self.sims = sims
+        self.batcher = MicroBatcher(ResidentInventory(inventory_file, i140_file, sims))
+
+    def query(self, payloads):
+        futures = [self.batcher.submit(parse_query(p)) for p in payloads]
+        return [f.result() for f in futures]
+
+    def reload(self, inventory_file=None, i140_file=None):
+        current = self.batcher.inventory
+        fresh = ResidentInventory(inventory_file or current.inventory_file, i140_file or current.i140_file, self.sims)
+        self.batcher.inventory = fresh
+        return {"inventory": fresh.inventory_file, "i140": fresh.i140_file or m.I140_FILE, "sheets": list(fresh.sheets)}
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _payload(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/health":
+                inventory = service.batcher.inventory
+                self._send(200, {"status": "ok", "inventory": inventory.inventory_file, "sheets": list(inventory.sheets)})
+            else:
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+
+        def do_POST(self):
+            try:
+                payload = self._payload()
+                if self.path == "/query":
+                    answers = service.query(payload if isinstance(payload, list) else [payload])
+                    self._send(200, answers if isinstance(payload, list) else answers[0])
+                elif self.path == "/reload":
+                    if not isinstance(payload, dict) or not all(isinstance(payload.get(k), (str, type(None))) for k in ("inventory", "i140")):
+                        raise ValueError("/reload expects a JSON object with optional inventory and i140 paths")
+                    self._send(200, service.reload(payload.get("inventory"), payload.get("i140")))
+                else:
+                    self._send(404, {"error": f"Unknown path: {self.path}"})
+            except KeyError as e:
+                # str() of a KeyError quotes its message.
+                self._send(400, {"error": str(e.args[0]) if e.args else str(e)})
+            except (ValueError, OSError) as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve wait-time queries from an in-memory inventory.")
+    parser.add_argument("--inventory", default=os.path.join(os.getcwd(), m.DATA_DIR, m.INVENTORY_FILE))
+    parser.add_argument("--i140", default=None)
+    parser.add_argument("--sims", type=int, default=m.SERVICE_SIMS)
+    parser.add_argument("--host", default=m.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=m.SERVICE_PORT)
+    args = parser.parse_args()
+
+    service = QueryService(args.inventory, args.i140, args.sims)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import numpy as np
+import macros as m
+
+
+class SimulationSummary:
+    # Fixed-memory summary of simulated wait times. Counts live in a fine
+    # fixed-width histogram, so summaries of separate chunks (or workers)
+    # merge exactly by adding counts, and quantiles are accurate to one bin.
+    def __init__(self, year_limit=m.YEAR_LIMIT, bin_width=m.SUMMARY_BIN_WIDTH, max_years=m.SUMMARY_MAX_YEARS):
+        self.year_limit = year_limit
+        self.bin_width = bin_width
+        self.max_years = max_years
+        self.n_bins = int(np.ceil(max_years / bin_width))
+        # Last bin collects everything past max_years.
+        self.counts = np.zeros(self.n_bins + 1, dtype=np.int64)
+        self.count = 0
+        self.zeros = 0
+        self.below = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, results):
+        results = np.asarray(results, dtype=float).ravel()
+        if results.size == 0:
+            return self
+        positive = results[results > 0]
+        bins = np.minimum((positive / self.bin_width).astype(np.int64), self.n_bins)
+        self.counts += np.bincount(bins, minlength=self.n_bins + 1)
+        self.count += results.size
+        self.zeros += results.size - positive.size
+        self.below += int(np.count_nonzero(results < self.year_limit))
+        self.total += float(results.sum())
+        self.total_sq += float(np.square(results).sum())
+        self.min = min(self.min, float(results.min()))
+        self.max = max(self.max, float(results.max()))
+        return self
+
+    def merge(self, other):
+        if (other.year_limit, other.bin_width, other.max_years) != (self.year_limit, self.bin_width, self.max_years):
+            raise ValueError("Cannot merge summaries with different year limits or bins")
+        self.counts += other.counts
+        self.count += other.count
+        self.zeros += other.zeros
+        self.below += other.below
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        var = (self.total_sq - self.total ** 2 / self.count) / (self.count - 1)
+        return float(np.sqrt(max(var, 0.0)))
+
+    def probability(self):
+        return self.below / self.count if self.count else 0.0
+
+    def probability_below(self, years):
+        if years == self.year_limit:
+            return self.probability()
+        # Exact at bin edges, linearly interpolated inside a bin otherwise.
+        if self.count == 0:
+            return 0.0
+        if years <= 0:
+            return 0.0
+        pos = min(years / self.bin_width, self.n_bins)
+        whole = int(pos)
+        below = self.zeros + self.counts[:whole].sum()
+        if whole < self.n_bins:
+            below += self.counts[whole] * (pos - whole)
+        return float(below / self.count)
+
+    def _value_at_rank(self, rank):
+        if self.count == 0:
+            return 0.0
+        rank = min(max(rank, 0.0), float(self.count))
+        if rank <= self.zeros:
+            return 0.0
+        cum = self.zeros + np.cumsum(self.counts)
+        i = int(np.searchsorted(cum, rank, side="left"))
+        if i >= self.n_bins:
+            return self.max
+        before = cum[i - 1] if i > 0 else self.zeros
+        frac = (rank - before) / self.counts[i] if self.counts[i] else 0.0
+        value = (i + frac) * self.bin_width
+        return float(min(max(value, self.min), self.max))
+
+    def quantile(self, q):
+        return self._value_at_rank(q * self.count)
+
+    def probability_interval(self, z=m.SUMMARY_CONFIDENCE_Z):
+        # Wilson score half-width, which stays positive when the probability is 0 or 1.
+        n = self.count
+        if n == 0:
+            return np.inf
+        p = self.probability()
+        return float(z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n))
+
+    def quantile_interval(self, q, z=m.SUMMARY_CONFIDENCE_Z):
+        # Distribution-free interval from the binomial spread of the q-th order statistic.
+        n = self.count
+        if n == 0:
+            return np.inf
+        spread = z * np.sqrt(n * q * (1 - q))
+        lower = self._value_at_rank(n * q - spread)
+        upper = self._value_at_rank(n * q + spread)
+        return (upper - lower) / 2 + self.bin_width / 2
+
+    def histogram(self, bins=m.HIST_BINS):
+        lo = self.min if self.count else 0.0
+        hi = self.max if self.count else 1.0
+        if hi <= lo:
+            hi = lo + self.bin_width
+        centers = (np.arange(self.n_bins + 1) + 0.5) * self.bin_width
+        centers[-1] = self.max
+        weights = self.counts.astype(float)
+        if self.zeros:
+            centers = np.append(centers, 0.0)
+            weights = np.append(weights, self.zeros)
+        counts, edges = np.histogram(np.clip(centers, lo, hi), bins=bins, range=(lo, hi), weights=weights)
+        return counts, edges
+
+    def kde(self, points=m.KDE_POINTS, cut=m.KDE_CUT, bandwidth=None):
+        # Gaussian KDE straight from the bins: the counts are linearly binned onto a
+        # grid of spacing bin_width and convolved with the kernel by FFT, so the cost
+        # depends on the occupied range rather than on the number of sims. The
+        # bandwidth defaults to Scott's rule, as in seaborn. Returns (x, density).
+        if self.count == 0:
+            return np.zeros(points), np.zeros(points)
+        h = bandwidth if bandwidth is not None else self.std() * self.count ** -0.2
+        h = max(h, self.bin_width)
+
+        occupied = np.flatnonzero(self.counts[:-1])
+        pos = [occupied + 0.5, [self.max / self.bin_width], [0.0]]
+        weights = [self.counts[occupied], [self.counts[-1]], [self.zeros]]
+        pos, weights = np.concatenate(pos), np.concatenate(weights).astype(float)
+        pos, weights = pos[weights > 0], weights[weights > 0]
+
+        pad = int(np.ceil(cut * h / self.bin_width)) + 1
+        start = int(np.floor(pos.min())) - pad
+        n = int(np.ceil(pos.max())) - start + pad + 1
+        grid = pos - start
+        i = np.minimum(grid.astype(np.int64), n - 2)
+        frac = grid - i
+        mass = np.bincount(i, weights * (1 - frac), n) + np.bincount(i + 1, weights * frac, n)
+
+        reach = int(np.ceil(5 * h / self.bin_width))
+        kernel = np.exp(-0.5 * (np.arange(-reach, reach + 1) * self.bin_width / h) ** 2)
+        kernel /= kernel.sum()
+        size = n + 2 * reach
+        smooth = np.fft.irfft(np.fft.rfft(mass, size) * np.fft.rfft(kernel, size), size)[reach:reach + n]
+        density = np.clip(smooth, 0, None) / (self.count * self.bin_width)
+
+        x = np.linspace(self.min - cut * h, self.max + cut * h, points)
+        return x, np.interp(x, (start + np.arange(n)) * self.bin_width, density, left=0.0, right=0.0)
+
+    def converged(self, prob_tolerance=None, p95_tolerance=None, min_sims=m.SUMMARY_MIN_SIMS):
+        if self.count < min_sims:
+            return False
+        if prob_tolerance is not None and self.probability_interval() > prob_tolerance:
+            return False
+        if p95_tolerance is not None and self.quantile_interval(0.95) > p95_tolerance:
+            return False
+        return True
+
+    def as_dict(self):
+        return {
+            "sims": self.count,
+            "mean": self.mean(),
+            "std": self.std(),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            f"prob_under_{self.year_limit:g}y": self.probability(),
+            "prob_ci": self.probability_interval(),
+            "p95_ci": self.quantile_interval(0.95),
+        }
@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # The scripts read data/ relative to the working directory.
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def make_sim():
+    import macros as m
+    from monte_carlo_visa_simulation import MonteCarloVisaSimulation
+
+    def make(sims=m.SIMS, seed=0, **kwargs):
+        kwargs.setdefault("target_date", m.TARGET_DATE)
+        return MonteCarloVisaSimulation(
+            file_path=os.path.join(ROOT, m.DATA_DIR, m.INVENTORY_FILE),
+            country=m.COUNTRY,
+            preference=m.PREFERENCE,
+            visa_bulletin_date=m.VISA_BULLETIN_DATE,
+            sims=sims,
+            seed=seed,
+            **kwargs,
+        )
+    return make
@@ -0,0 +1,8 @@
+import numpy as np
+
+
+def test_analytic_quantiles_within_bound_of_monte_carlo(make_sim):
+    t_grid, cdf, bound = make_sim().wait_time_distribution()
+    results = np.asarray(make_sim(sims=100_000, seed=0).monte_carlo(engine="vectorized"))
+    levels = [0.1, 0.25, 0.5, 0.75, 0.9, 0.95]
+    np.testing.assert_allclose(np.interp(levels, cdf, t_grid), np.quantile(results, levels), rtol=0, atol=bound)
@@ -0,0 +1,44 @@
+import os
+import pytest
+import macros as m
+import batch_report
+from batch_report import run_batch
+
+INVENTORY = os.path.join(m.DATA_DIR, m.INVENTORY_FILE)
+COLUMNS = ["country", "preference", "target_date", "visa_bulletin_date", "people_ahead", "p50", "p95", "prob_under_5y"]
+
+
+def test_charts_without_a_renderer(tmp_path):
+    results = run_batch(INVENTORY, [m.TARGET_DATE], sims=200, workers=1, charts_dir=str(tmp_path))
+    assert len(results) > 0 and list(results.columns) == COLUMNS
+    assert len(os.listdir(tmp_path)) == len(results)
+
+
+def test_no_jobs_gives_an_empty_table(monkeypatch):
+    monkeypatch.setattr("batch_report.build_jobs", lambda *args: [])
+    results = run_batch(INVENTORY, [m.TARGET_DATE], sims=200, workers=1)
+    assert results.empty
+    assert list(results.columns) == COLUMNS
+
+
+def _init_in_process():
+    from compact_inventory import CompactInventory
+    from flatten_data import load_inventory_sheets
+    compact = CompactInventory.from_sheets(load_inventory_sheets(INVENTORY))
+    batch_report._init_worker(INVENTORY, compact, {("China", "EB2"): 0, ("Nowhere", "EB2"): 0})
+
+
+def test_pair_without_backlog_gives_no_rows():
+    _init_in_process()
+    table, charts = batch_report._run_job(("Nowhere", "EB2", [m.TARGET_DATE], m.VISA_BULLETIN_DATE, 200, 5, None))
+    assert table.empty and charts == []
+
+
+def test_engine_index_errors_are_not_hidden(monkeypatch):
+    _init_in_process()
+
+    def broken(*args, **kwargs):
+        raise IndexError("engine bug")
+    monkeypatch.setattr("batch_report.MonteCarloVisaSimulation.wait_time_curve", broken)
+    with pytest.raises(IndexError, match="engine bug"):
+        batch_report._run_job(("China", "EB2", [m.TARGET_DATE], m.VISA_BULLETIN_DATE, 200, 5, None))
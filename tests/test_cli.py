@@ -0,0 +1,36 @@
+import pytest
+import cli
+
+
+@pytest.mark.parametrize("name, text, expected", [
+    ("SIMS", "1e4", 10000),
+    ("SIMS", "2500", 2500),
+    ("ATTRITION_MAX", "1", 1.0),
+    ("USE_CACHE", "false", False),
+    ("USE_CACHE", "1", True),
+    ("SEED", "none", None),
+    ("SEED", "7", 7),
+    ("TARGET_DATE", "2024-01-01", "2024-01-01"),
+    ("COUNTRY", "India", "India"),
+])
+def test_set_values_take_the_macro_type(name, text, expected):
+    value = cli._coerce(name, text)
+    assert value == expected and type(value) is type(expected)
+
+
+@pytest.mark.parametrize("name, text", [
+    ("SIMS", "2.5"),
+    ("SIMS", "abc"),
+    ("USE_CACHE", "maybe"),
+    ("TARGET_DATE", "2024-13-01"),
+])
+def test_unparseable_set_values_are_rejected(name, text):
+    with pytest.raises(ValueError):
+        cli._coerce(name, text)
+
+
+def test_bad_override_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit:
+        cli.main(["--set", "SIMS=abc", "--no-plot"])
+    assert exit.value.code == 2
+    assert "SIMS expects a number" in capsys.readouterr().err
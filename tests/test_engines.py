@@ -0,0 +1,10 @@
+import numpy as np
+
+
+def test_vectorized_matches_loop_distribution(make_sim):
+    loop = np.asarray(make_sim(sims=4000, seed=0).monte_carlo(engine="loop"))
+    vectorized = np.asarray(make_sim(sims=4000, seed=0).monte_carlo(engine="vectorized"))
+    # Independent draws: compare within a few standard errors.
+    standard_error = loop.std() * np.sqrt(2 / len(loop))
+    assert abs(vectorized.mean() - loop.mean()) < 4 * standard_error
+    np.testing.assert_allclose(np.quantile(vectorized, [0.1, 0.5, 0.9]), np.quantile(loop, [0.1, 0.5, 0.9]), atol=0.25)
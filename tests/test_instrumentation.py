@@ -0,0 +1,38 @@
+import threading
+import time
+import tracemalloc
+import pytest
+import instrumentation
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    monkeypatch.setitem(instrumentation._state, "enabled", True)
+    monkeypatch.setitem(instrumentation._state, "memory", True)
+    monkeypatch.setattr(instrumentation, "_spans", [])
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_spans_on_other_threads_skip_memory_and_count_only_their_cpu(tracing):
+    def busy():
+        with instrumentation.span("busy"):
+            end = time.perf_counter() + 0.2
+            while time.perf_counter() < end:
+                pass
+
+    def idle():
+        with instrumentation.span("idle"):
+            time.sleep(0.2)
+
+    threads = [threading.Thread(target=busy), threading.Thread(target=idle)]
+    with instrumentation.span("main"):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    records = {record["name"]: record for record in instrumentation.spans()}
+    assert "peak_mb" in records["main"]
+    assert "peak_mb" not in records["busy"] and "peak_mb" not in records["idle"]
+    assert records["idle"]["cpu_s"] < 0.05
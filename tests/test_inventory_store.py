@@ -0,0 +1,24 @@
+import os
+import pytest
+import macros as m
+from compact_inventory import CompactInventory
+from flatten_data import load_inventory_sheets
+from inventory_store import InventoryStore
+
+INVENTORY = os.path.join(m.DATA_DIR, m.INVENTORY_FILE)
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    store = InventoryStore(str(tmp_path_factory.mktemp("history")))
+    store.ingest(INVENTORY)
+    return store
+
+
+@pytest.mark.parametrize("status", ["Available", "Awaiting Availability"])
+def test_history_totals_match_inventory_for_multi_category_preference(store, status):
+    compact = CompactInventory.from_sheets(load_inventory_sheets(INVENTORY))
+    release = store.releases()[0]
+    for country in compact.countries:
+        months, counts = compact.series(country, "EB5", status)
+        assert store.history(country, "EB5", status)[release].sum() == counts.sum()
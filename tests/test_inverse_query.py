@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+import macros as m
+
+SIMS = 2000
+CONFIDENCES = (0.5, 0.9, 0.95)
+
+
+def linear_scan(curve, dates, years, confidence):
+    # Latest date whose same-draw forward run clears within `years` in at least as
+    # many sims as the inverse query's rank keeps; NaT when the whole range does.
+    cleared = np.rint(curve[f"prob_under_{years:g}y"].to_numpy() * SIMS)
+    ok = np.flatnonzero(cleared >= SIMS - int(np.floor((1 - confidence) * SIMS)))
+    return pd.NaT if ok[-1] == len(dates) - 1 else dates[ok[-1]]
+
+
+@pytest.mark.parametrize("years", [2, 5])
+def test_inverse_query_matches_a_linear_scan(make_sim, years):
+    table = make_sim(sims=SIMS, seed=0).inverse_query(years=years, confidences=CONFIDENCES)
+    # Same seed and chunking, so the forward runs see the same draws.
+    dates = pd.date_range(m.VISA_BULLETIN_DATE, m.I140_INVENTORY_DATE, freq="D")
+    curve = make_sim(sims=SIMS, seed=0).wait_time_curve(dates, quantiles=(), years=years)
+    for q in CONFIDENCES:
+        latest, expected = table.loc[q, f"latest_pd_{years:g}y"], linear_scan(curve, dates, years, q)
+        assert (pd.isna(latest) and pd.isna(expected)) or latest == expected
+
+    forward = make_sim(sims=SIMS, seed=0).wait_time_curve([m.TARGET_DATE], quantiles=CONFIDENCES, years=years)
+    np.testing.assert_allclose(table["years_needed"], [forward[f"p{q * 100:g}"].iloc[0] for q in CONFIDENCES])
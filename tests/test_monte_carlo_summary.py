@@ -0,0 +1,12 @@
+import macros as m
+
+
+def test_loose_tolerance_stops_before_budget(make_sim):
+    sim = make_sim()
+    summary = sim.monte_carlo_summary(prob_tolerance=0.05)
+    assert m.SUMMARY_MIN_SIMS <= summary.count < sim.sims
+
+
+def test_without_tolerance_runs_full_budget(make_sim):
+    sim = make_sim(sims=3000)
+    assert sim.monte_carlo_summary().count == sim.sims
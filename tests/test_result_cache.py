@@ -0,0 +1,26 @@
+import numpy as np
+from result_cache import ResultCache, cached_monte_carlo
+
+
+def test_unseeded_hit_reports_the_producing_seed(make_sim, tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    first = make_sim(sims=2000, seed=None)
+    results, _ = cached_monte_carlo(first, cache=cache, store_results=True)
+
+    for hit_cache in (cache, ResultCache(directory=str(tmp_path))):
+        second = make_sim(sims=2000, seed=None)
+        cached, _ = cached_monte_carlo(second, cache=hit_cache, store_results=True)
+        assert second.seed == first.seed
+        np.testing.assert_array_equal(cached, results)
+        np.testing.assert_array_equal(second.monte_carlo(), results)
+
+    rerun = make_sim(sims=2000, seed=first.seed)
+    np.testing.assert_array_equal(rerun.monte_carlo(), results)
+
+
+def test_clear_removes_only_cache_entries(make_sim, tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    cached_monte_carlo(make_sim(sims=500), cache=cache)
+    (tmp_path / "notes.txt").write_text("keep")
+    cache.clear()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["notes.txt"]
@@ -0,0 +1,20 @@
+import warnings
+import numpy as np
+import pytest
+import sampling
+
+
+@pytest.mark.parametrize("method", sampling.SAMPLING_METHODS)
+def test_sampled_run_is_warning_free(make_sim, method):
+    sim = make_sim(sims=1000)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results, report = sim.monte_carlo_sampled(method=method, replicates=4)
+    assert len(results) >= sim.sims
+    if method == "sobol":
+        assert len(results) == 4 * 256
+
+
+def test_sobol_rejects_unbalanced_sizes():
+    with pytest.raises(ValueError):
+        sampling.draw_uniforms(np.random.default_rng(0), 250, 4, "sobol")
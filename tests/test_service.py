@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+import pytest
+import macros as m
+from service import QueryService, make_handler, parse_query
+
+
+@pytest.fixture(scope="module")
+def service():
+    return QueryService(os.path.join(m.DATA_DIR, m.INVENTORY_FILE), sims=500)
+
+
+@pytest.fixture(scope="module")
+def server(service):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, path, body):
+    connection = HTTPConnection(*server.server_address, timeout=30)
+    connection.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_query_answers_each_payload(service):
+    answers = service.query([{"country": "China", "preference": "EB2", "target_date": "2022-01-01"},
+                             {"country": "China", "preference": "EB2", "target_date": "2024-06-15", "years": 3}])
+    assert [a["target_date"] for a in answers] == ["2022-01-01", "2024-06-15"]
+    assert answers[0]["p50"] < answers[1]["p50"]
+    assert all(0 <= a["probability"] <= 1 and a["p50"] <= a["p95"] for a in answers)
+
+
+@pytest.mark.parametrize("body", [[1], {"years": None}, {"target_date": "not a date"}, {"country": 7}])
+def test_bad_query_is_a_400(server, body):
+    status, answer = post(server, "/query", body)
+    assert status == 400 and "error" in answer
+
+
+def test_reload_of_missing_file_reports_the_message(server):
+    status, answer = post(server, "/reload", {"inventory": "no_such_inventory.xlsx"})
+    assert status == 400
+    assert "no_such_inventory.xlsx" in answer["error"]
+
+
+def test_unexpected_failure_is_a_500(server, monkeypatch):
+    monkeypatch.setattr("service.MonteCarloVisaSimulation.wait_time_curve", lambda *args, **kwargs: 1 / 0)
+    status, answer = post(server, "/query", {"country": "India", "preference": "EB3"})
+    assert status == 500 and "ZeroDivisionError" in answer["error"]
+
+
+def test_parse_query_fills_defaults():
+    assert parse_query({}) == {"country": m.COUNTRY, "preference": m.PREFERENCE, "target_date": m.TARGET_DATE,
+                               "visa_bulletin_date": m.VISA_BULLETIN_DATE, "years": float(m.YEAR_LIMIT)}
@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def test_sharded_run_is_identical_for_any_worker_count(make_sim):
+    runs = [make_sim(sims=6000, seed=42).monte_carlo_sharded(workers=workers, shard_size=1000) for workers in (1, 2, 3)]
+    for run in runs[1:]:
+        assert run.as_dict() == runs[0].as_dict()
+        np.testing.assert_array_equal(run.counts, runs[0].counts)
+
+
+def test_sharded_run_depends_on_the_seed(make_sim):
+    first = make_sim(sims=2000, seed=1).monte_carlo_sharded(workers=1, shard_size=1000)
+    second = make_sim(sims=2000, seed=2).monte_carlo_sharded(workers=1, shard_size=1000)
+    assert first.as_dict() != second.as_dict()
@@ -0,0 +1,17 @@
+import numpy as np
+import macros as m
+import sampling
+
+PROBS = [0.25, 0.35, 0.25, 0.1, 0.05]
+
+
+def test_reweighted_row_matches_a_rerun(make_sim, monkeypatch):
+    table = make_sim(sims=20_000, seed=0).sweep({"SPILLOVER_PROBS": [PROBS]})
+    row = table[table["parameter"] == "SPILLOVER_PROBS"].iloc[0]
+    assert row["method"] == "reweight"
+
+    monkeypatch.setattr(m, "SPILLOVER_PROBS", PROBS)
+    rerun = sampling.estimates(np.asarray(make_sim(sims=100_000, seed=1).monte_carlo()), m.YEAR_LIMIT)
+    assert abs(row["mean"] - rerun["mean"]) < 0.05
+    assert abs(row["p50"] - rerun["p50"]) < 0.05
+    assert abs(row["prob_under_5y"] - rerun["prob_under_5y"]) < 0.015